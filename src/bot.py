@@ -23,12 +23,7 @@ from config import (
     SELECT_TELEGRAPH_SUMMARY_MODEL,
 )
 from handlers.auth_handlers import start, check_password, cancel_auth
-from handlers.command_handlers import (
-    help_command,
-    api_quota,
-    toggle_web_search,
-    toggle_url_context,
-)
+from handlers.command_handlers import MENU_ACTIONS, help_command, route_menu_button
 from handlers.conversation_handlers import (
     choose_prompt_start,
     prompt_chosen,
@@ -44,17 +39,14 @@ from handlers.message_handlers import (
     url_processor_worker,
     handle_qna_reply,
 )
-from handlers.callback_handlers import (
-    generate_telegraph_page,
-    retry_hashtags,
-    retry_summary,
-    save_to_linkwarden,
-)
+from handlers.callback_handlers import route_callback_query
+from core.extractor import close_http_sessions
 
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully."""
-    print("\n✓ Shutting down bot (Ctrl+C pressed)...", flush=True)
+    sys.stdout.write("\n✓ Shutting down bot (Ctrl+C pressed)...\n")
+    sys.stdout.flush()
     sys.exit(0)
 
 
@@ -77,7 +69,7 @@ def setup_handlers(application: Application):
     # Add conversation handler for choosing a prompt
     prompt_conv_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.Regex("^📝 Choose Prompt$"), choose_prompt_start)
+            MessageHandler(filters.Text(["📝 Choose Prompt"]), choose_prompt_start)
         ],
         states={
             CHOOSE_PROMPT: [
@@ -91,7 +83,7 @@ def setup_handlers(application: Application):
     # Add conversation handler for choosing a model
     model_conv_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.Regex("^🤖 Change Model$"), choose_model_start)
+            MessageHandler(filters.Text(["🤖 Change Model"]), choose_model_start)
         ],
         states={
             CHOOSE_MODEL: [
@@ -112,32 +104,15 @@ def setup_handlers(application: Application):
     )
     application.add_handler(model_conv_handler)
 
-    # Add handler for API quota
-    application.add_handler(MessageHandler(filters.Regex("^📊 API Quota$"), api_quota))
-
-    # Add handlers for toggling features
+    # Add a single handler for the API quota and feature toggle buttons
     application.add_handler(
-        MessageHandler(filters.Regex("^🌐 Web Search On/Off$"), toggle_web_search)
-    )
-    application.add_handler(
-        MessageHandler(filters.Regex("^🔗 URL Context On/Off$"), toggle_url_context)
+        MessageHandler(filters.Text(list(MENU_ACTIONS)), route_menu_button)
     )
 
     # Add callback handlers BEFORE the generic message handler
-    # Add callback handler for Telegraph page creation
-    application.add_handler(
-        CallbackQueryHandler(generate_telegraph_page, pattern="^create_telegraph_page:")
-    )
-    # Add callback handler for retrying hashtags
-    application.add_handler(
-        CallbackQueryHandler(retry_hashtags, pattern="^retry_hashtags:")
-    )
-    # Add callback handler for saving to LinkWarden
-    application.add_handler(
-        CallbackQueryHandler(save_to_linkwarden, pattern="^save_to_linkwarden:")
-    )
-    # Add callback handler for retrying the whole summary
-    application.add_handler(CallbackQueryHandler(retry_summary, pattern="^retry:"))
+    # A single handler routes Telegraph page creation, hashtag retry,
+    # LinkWarden saving and summary retry by callback data prefix
+    application.add_handler(CallbackQueryHandler(route_callback_query))
 
     # Add the Q&A reply handler. This specifically looks for replies.
     application.add_handler(
@@ -157,10 +132,15 @@ async def post_init_hook(application: Application):
     This function will be called after the Application is initialized.
     It's the perfect place to start background tasks.
     """
-    print("Starting URL processor worker...", flush=True)
+    print("Starting URL processor worker...")
     asyncio.create_task(url_processor_worker())
 
 
+async def post_shutdown_hook(application: Application):
+    """Closes the shared HTTP sessions when the Application shuts down."""
+    await close_http_sessions()
+
+
 def main():
     """Main function to run the bot."""
     # Setup signal handler for Ctrl+C
@@ -180,6 +160,7 @@ def main():
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
         .post_init(post_init_hook)
+        .post_shutdown(post_shutdown_hook)
         .read_timeout(30)
         .write_timeout(30)
         .connect_timeout(30)
@@ -191,9 +172,11 @@ def main():
     setup_handlers(application)
 
     # Run the bot until the user presses Ctrl-C
-    print("Bot is starting...")
-    print("Connecting to Telegram servers...")
-    print("Waiting for messages... (send /start to your bot to test)")
+    print(
+        "Bot is starting...\n"
+        "Connecting to Telegram servers...\n"
+        "Waiting for messages... (send /start to your bot to test)"
+    )
     try:
         application.run_polling(
             allowed_updates=Update.ALL_TYPES,
@@ -3,8 +3,6 @@ Configuration and constants for the Telegram bot.
 """
 
 import os
-import pathlib
-import json
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -21,9 +19,18 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 LINKWARDEN_URL = os.getenv("LINKWARDEN_URL")
 LINKWARDEN_API_KEY = os.getenv("LINKWARDEN_API_KEY")
 
+FLARESOLVERR_URL = os.getenv("FLARESOLVERR_URL")
+
 # Paths
 PROMPTS_FOLDER = os.path.join("src", "prompts")
 QUOTA_FILE_PATH = os.path.join("src", "data", "quota.json")
+LLM_CACHE_PATH = os.path.join("src", "data", "llm_cache.sqlite3")
+
+# LLM response cache lifetime in seconds (0 disables the cache)
+LLM_CACHE_TTL_SUMMARY = int(os.getenv("LLM_CACHE_TTL_SUMMARY", 7 * 24 * 3600))
+LLM_CACHE_TTL_QNA = int(os.getenv("LLM_CACHE_TTL_QNA", 24 * 3600))
+# Maximum concurrent requests to the same LLM model
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", 4)))
 
 # Conversation states
 (
@@ -35,7 +42,7 @@ QUOTA_FILE_PATH = os.path.join("src", "data", "quota.json")
 ) = range(5)
 
 # List of random emojis for article titles
-TITLE_EMOJIS = [
+TITLE_EMOJIS = (
     "📰",
     "📄",
     "📃",
@@ -66,45 +73,74 @@ TITLE_EMOJIS = [
     "🏆",
     "🎁",
     "🎉",
-]
+)
 
 
 def load_available_models():
-    """Load available models from quota.json file."""
+    """Load available models from the quota data (see core.quota_manager)."""
+    # Local import: quota_manager imports this module in turn.
+    # get_quota_data returns the in-memory copy (quota.json is re-read only
+    # when it changes on disk), including changes not yet written back, e.g.
+    # models just added by sync_models.
+    from core.quota_manager import get_quota_data
+
+    # A missing or corrupt quota.json is not re-initialized here (provider API
+    # calls, stored usage overwritten): too slow and destructive for building a
+    # menu, use the defaults instead
     try:
-        with open(QUOTA_FILE_PATH, "r", encoding="utf-8") as f:
-            quota_data = json.load(f)
-            models = []
-
-            # Gemini
-            for m in quota_data.get("gemini", {}).keys():
-                models.append(f"Gemini: {m}")
-
-            # Groq
-            if GROQ_API_KEY:
-                for m in quota_data.get("groq", {}).keys():
-                    models.append(f"Groq: {m}")
-
-            # OpenRouter
-            if OPENROUTER_API_KEY:
-                for m in quota_data.get("openrouter", {}).keys():
-                    models.append(f"OpenRouter: {m}")
-
-            return models
+        quota_data = get_quota_data(reinitialize=False)
     except FileNotFoundError:
         print(f"Warning: {QUOTA_FILE_PATH} not found. Using default models.")
         return ["gemini-2.5-flash", "gemini-2.0-flash"]
-    except json.JSONDecodeError:
+    except ValueError:  # JSONDecodeError (json and orjson)
         print(f"Warning: Error parsing {QUOTA_FILE_PATH}. Using default models.")
         return ["gemini-2.5-flash", "gemini-2.0-flash"]
+    except OSError as e:
+        print(f"Warning: unable to read {QUOTA_FILE_PATH} ({e}). Using default models.")
+        return ["gemini-2.5-flash", "gemini-2.0-flash"]
+
+    models = []
+
+    # Gemini
+    for m in quota_data.get("gemini", {}).keys():
+        models.append(f"Gemini: {m}")
+
+    # Groq
+    if GROQ_API_KEY:
+        for m in quota_data.get("groq", {}).keys():
+            models.append(f"Groq: {m}")
+
+    # OpenRouter
+    if OPENROUTER_API_KEY:
+        for m in quota_data.get("openrouter", {}).get("models", []):
+            models.append(f"OpenRouter: {m}")
+
+    return models
+
+
+def get_default_model(fallback: str = "gemini-2.5-flash") -> str:
+    """Return the first available model, or ``fallback`` if none is configured."""
+    models = load_available_models()
+    return models[0] if models else fallback
+
+
+# Cached prompt list, refreshed only when the prompts folder changes
+_prompts_cache = {"mtime": None, "prompts": []}
 
 
 def load_available_prompts():
     """Load available prompts from prompts folder."""
     try:
-        return [
-            f.split(".")[0] for f in os.listdir(PROMPTS_FOLDER) if f.endswith(".md")
-        ]
+        mtime = os.stat(PROMPTS_FOLDER).st_mtime_ns
+        if _prompts_cache["mtime"] != mtime:
+            with os.scandir(PROMPTS_FOLDER) as entries:
+                _prompts_cache["prompts"] = [
+                    entry.name.removesuffix(".md")
+                    for entry in entries
+                    if entry.name.endswith(".md") and entry.is_file()
+                ]
+            _prompts_cache["mtime"] = mtime
+        return list(_prompts_cache["prompts"])
     except Exception as e:
         print(f"Warning: Error loading prompts: {e}")
         return ["technical_summary"]
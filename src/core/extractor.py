@@ -5,7 +5,9 @@ Fornisce funzioni per estrarre e formattare il contenuto in vari formati.
 
 import asyncio
 import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 import random
 import re
 from dataclasses import dataclass
@@ -14,11 +16,93 @@ from urllib.parse import urlparse
 
 import aiohttp
 import trafilatura
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from curl_cffi.requests import AsyncSession
 
+from config import FLARESOLVERR_URL
 from .http_config import get_random_headers
 
+# Pattern e tag usati dagli estrattori BeautifulSoup, compilati una sola volta
+_LESSWRONG_CONTENT_RE = re.compile(r"PostsPage-postContent")
+_CONTENT_CLASS_RE = re.compile(
+    r"(post|content|article|text|body|entry|story|paragraph|reader)", re.IGNORECASE
+)
+_CONTENT_ID_RE = re.compile(
+    r"(post|content|article|text|body|entry|story|main)", re.IGNORECASE
+)
+# Parser C di lxml (già richiesto da trafilatura), molto più veloce di html.parser
+_BS_PARSER = "lxml"
+# Pool di processi per l'estrazione (CPU-bound): vero parallelismo senza
+# bloccare l'event loop con il GIL. Creato alla prima estrazione.
+_extract_pool: Optional[ProcessPoolExecutor] = None
+
+# Limita le estrazioni Trafilatura (CPU-bound) contemporanee al numero di core
+_TRAFILATURA_SEMAPHORE = asyncio.Semaphore(os.cpu_count() or 1)
+
+# Secondi di vantaggio concessi ad aiohttp prima di avviare curl_cffi in parallelo
+_HEDGE_DELAY = 2.0
+
+_CONTENT_TAG_RE = re.compile(r"<(?:title|article|main|body|p)\b", re.IGNORECASE)
+# Il fallback costruisce il DOM solo per body, titolo e meta tag: gli script,
+# gli stili e il resto dell'<head> non vengono proprio analizzati
+_BS_FALLBACK_STRAINER = SoupStrainer(["title", "meta", "body"])
+_BS_STRIP_TAGS = ("script", "style", "header", "footer", "nav", "aside", "iframe")
+
+# Sessione aiohttp condivisa tra le richieste: riusa connessioni, cache DNS e
+# contesto TLS invece di ricrearli per ogni URL (vedi _get_session)
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+# Sessione curl_cffi condivisa: l'impersonazione TLS/JA3 è costosa da preparare
+_curl_session: Optional[AsyncSession] = None
+_curl_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """
+    Restituisce la sessione aiohttp condivisa, creandola alla prima richiesta.
+
+    La creazione è sincrona (nessun await), quindi non servono lock: due task
+    non possono interleavarsi tra il controllo e l'assegnazione. La sessione
+    viene ricreata se chiusa o se appartiene a un altro event loop.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+        )
+        _session_loop = loop
+    return _session
+
+
+def _get_curl_session() -> AsyncSession:
+    """
+    Restituisce la sessione curl_cffi condivisa (impersonazione "chrome"),
+    creandola al primo uso o se appartiene a un altro event loop.
+    """
+    global _curl_session, _curl_session_loop
+    loop = asyncio.get_running_loop()
+    if _curl_session is None or _curl_session_loop is not loop:
+        # Usa 'chrome' come impersonazione sicura e moderna
+        _curl_session = AsyncSession(impersonate="chrome")
+        _curl_session_loop = loop
+    return _curl_session
+
+
+async def close_http_sessions() -> None:
+    """
+    Chiude le sessioni HTTP condivise e il pool di estrazione (da chiamare allo
+    shutdown del bot).
+    """
+    global _session, _curl_session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    if _curl_session is not None:
+        await _curl_session.close()
+    _curl_session = None
+    _shutdown_extract_pool()
+
 
 @dataclass
 class ArticleContent:
@@ -34,6 +118,10 @@ class ArticleContent:
     categories: Optional[list] = None
     tags: Optional[list] = None
     images: Optional[list] = None
+    # True se la pagina è stata scaricata con una semplice richiesta aiohttp ed
+    # estratta da Trafilatura (nessun curl_cffi/FlareSolverr/BeautifulSoup): il
+    # sito non blocca i bot, quindi anche un LLM può leggerla dall'URL
+    plain_fetch: bool = False
 
     def to_dict(self) -> Dict[str, Any]:
         """Converte l'articolo in un dizionario."""
@@ -57,7 +145,7 @@ async def _extract_lesswrong(html_content: str, url: str) -> Optional[ArticleCon
     Estrae il titolo da h1.PostsPageTitle-root e il testo da div.PostsPage-postContent.
     """
     try:
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = BeautifulSoup(html_content, _BS_PARSER)
 
         # Estrai il titolo
         title = "Titolo non disponibile"
@@ -66,7 +154,7 @@ async def _extract_lesswrong(html_content: str, url: str) -> Optional[ArticleCon
             title = title_elem.get_text(separator=" ", strip=True)
 
         # Estrai il contenuto
-        content_div = soup.find("div", class_=re.compile(r"PostsPage-postContent"))
+        content_div = soup.find("div", class_=_LESSWRONG_CONTENT_RE)
         if not content_div:
             return None
 
@@ -95,26 +183,25 @@ async def _extract_lesswrong(html_content: str, url: str) -> Optional[ArticleCon
         return None
 
 
-async def _scrape_with_beautifulsoup(html_content: str) -> Optional[Dict[str, Any]]:
+def _scrape_with_beautifulsoup(html_content: str) -> Optional[Dict[str, Any]]:
     """
     Estrae il contenuto da HTML usando BeautifulSoup come fallback.
     Versione più permissiva che estrae tutto il testo disponibile.
+
+    Funzione sincrona (CPU-bound), eseguita nel pool di processi.
     """
+    # Pagine minuscole senza alcun tag di contenuto: inutile avviare il parser
+    if len(html_content) < 512 and not _CONTENT_TAG_RE.search(html_content):
+        return None
+
     try:
-        soup = BeautifulSoup(html_content, "html.parser")
-
-        # Rimuovi elementi non desiderati
-        for element in soup(
-            [
-                "script",
-                "style",
-                "header",
-                "footer",
-                "nav",
-                "aside",
-                "iframe",
-            ]
-        ):
+        soup = BeautifulSoup(
+            html_content, _BS_PARSER, parse_only=_BS_FALLBACK_STRAINER
+        )
+
+        # Rimuovi elementi non desiderati (ancora necessario: il body viene
+        # mantenuto per intero, compresi script e nav annidati)
+        for element in soup(_BS_STRIP_TAGS):
             element.decompose()
 
         # Prova diversi metodi per trovare il contenuto, dal più specifico al più generico
@@ -125,22 +212,11 @@ async def _scrape_with_beautifulsoup(html_content: str) -> Optional[Dict[str, An
 
         # 2. Cerca div con classi comuni per contenuti
         if not article_body:
-            article_body = soup.find(
-                "div",
-                class_=re.compile(
-                    r"(post|content|article|text|body|entry|story|paragraph|reader)",
-                    re.IGNORECASE,
-                ),
-            )
+            article_body = soup.find("div", class_=_CONTENT_CLASS_RE)
 
         # 3. Cerca per id comuni
         if not article_body:
-            article_body = soup.find(
-                "div",
-                id=re.compile(
-                    r"(post|content|article|text|body|entry|story|main)", re.IGNORECASE
-                ),
-            )
+            article_body = soup.find("div", id=_CONTENT_ID_RE)
 
         # 4. Fallback: usa tutto il body
         if not article_body:
@@ -185,22 +261,183 @@ async def _scrape_with_beautifulsoup(html_content: str) -> Optional[Dict[str, An
         return None
 
 
+def _get_extract_pool() -> ProcessPoolExecutor:
+    """Restituisce il pool di processi per l'estrazione, creandolo se necessario."""
+    global _extract_pool
+    if _extract_pool is None:
+        # "forkserver" invece del fork predefinito su Linux: il processo ha già
+        # thread attivi (flush della quota, to_thread) e un figlio creato con
+        # fork mentre uno di loro tiene un lock resterebbe bloccato per sempre
+        _extract_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _extract_pool
+
+
+def _shutdown_extract_pool() -> None:
+    """Termina il pool di processi per l'estrazione, se esiste."""
+    global _extract_pool
+    if _extract_pool is not None:
+        _extract_pool.shutdown(wait=False, cancel_futures=True)
+    _extract_pool = None
+
+
+def _extract_with_trafilatura(
+    html_content: bytes, include_images: bool, include_links: bool, with_metadata: bool
+) -> Optional[Dict[str, Any]]:
+    """
+    Esegue Trafilatura e restituisce i campi utili come dizionario.
+
+    Funzione top-level (serializzabile con pickle) eseguita nel pool di processi:
+    il Document di Trafilatura contiene alberi lxml, che non sono serializzabili.
+    """
+    document = trafilatura.bare_extraction(
+        html_content,
+        include_images=include_images,
+        include_links=include_links,
+        output_format="python",
+        with_metadata=with_metadata,
+        favor_recall=False,
+    )
+    if not document:
+        return None
+    return {
+        field: getattr(document, field, None)
+        for field in (
+            "title",
+            "text",
+            "author",
+            "date",
+            "description",
+            "sitename",
+            "categories",
+            "tags",
+            "image",
+        )
+    }
+
+
+async def _run_in_extract_pool(func, *args):
+    """
+    Esegue ``func(*args)`` nel pool di processi; se il pool non è utilizzabile
+    (es. processo figlio terminato) ripiega su un thread.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_extract_pool(), func, *args)
+    except (OSError, RuntimeError) as e:
+        # BrokenProcessPool è una sottoclasse di RuntimeError
+        print(f"Pool di estrazione non disponibile ({e}), uso un thread...")
+        _shutdown_extract_pool()
+        return await asyncio.to_thread(func, *args)
+
+
+async def _fetch_with_aiohttp(
+    url: str, timeout: int = 15, max_retries: int = 3
+) -> Tuple[Optional[bytes], Optional[Any]]:
+    """
+    Scarica l'URL con la sessione aiohttp condivisa, ritentando sui 429.
+    """
+    html_content = None
+    last_error = None
+    session = _get_session()
+    for attempt in range(max_retries):
+        try:
+            request_headers = get_random_headers()
+            async with session.get(
+                url, timeout=timeout, ssl=False, headers=request_headers
+            ) as response:
+                if response.status == 429:
+                    if attempt < max_retries - 1:
+                        wait_time = random.uniform(5, 10)
+                        print(f"Attempt {attempt + 1}/{max_retries} failed (429). Retrying in {wait_time:.1f}s...")
+                        await asyncio.sleep(wait_time)
+                        continue
+
+                # Se otteniamo 403 o 429 persistente, interrompiamo per passare a curl_cffi
+                if response.status in [403, 429]:
+                    last_error = f"HTTP {response.status}"
+                    print(f"aiohttp bloccato con status {response.status}. Passaggio al fallback.")
+                    break
+
+                response.raise_for_status()
+                html_content = await response.read()
+                last_error = None
+                break
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_error = e
+            print(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
+            # Non ritentiamo su errori di connessione se vogliamo provare curl_cffi
+            break
+
+    return html_content, last_error
+
+
+async def _fetch_hedged(
+    url: str, timeout: int = 15, max_retries: int = 3
+) -> Tuple[Optional[bytes], Optional[Any], bool]:
+    """
+    Corsa tra aiohttp e curl_cffi: curl_cffi parte come "hedge" dopo
+    _HEDGE_DELAY secondi, o subito se aiohttp fallisce prima.
+    Restituisce il primo contenuto ottenuto, l'ultimo errore e se il contenuto
+    viene da aiohttp; i task perdenti vengono annullati.
+    """
+    aiohttp_task = asyncio.create_task(_fetch_with_aiohttp(url, timeout, max_retries))
+    done, _ = await asyncio.wait({aiohttp_task}, timeout=_HEDGE_DELAY)
+    if done:
+        html_content, last_error = aiohttp_task.result()
+        if html_content:
+            return html_content, None, True
+        print(f"aiohttp fallito. Avvio procedura di fallback avanzata per {url}...")
+        pending = [asyncio.create_task(_fetch_with_curl_cffi(url, timeout))]
+    else:
+        print(f"aiohttp lento per {url}, avvio curl_cffi in parallelo...")
+        pending = [
+            aiohttp_task,
+            asyncio.create_task(_fetch_with_curl_cffi(url, timeout)),
+        ]
+
+    html_content = None
+    last_error = None
+    try:
+        for next_done in asyncio.as_completed(pending):
+            content, error = await next_done
+            if content:
+                html_content, last_error = content, None
+                break
+            print(f"Fetch fallito: {error}")
+            last_error = error
+    finally:
+        for task in pending:
+            if not task.done():
+                task.cancel()
+
+    from_aiohttp = (
+        html_content is not None
+        and aiohttp_task.done()
+        and not aiohttp_task.cancelled()
+        and aiohttp_task.exception() is None
+        and aiohttp_task.result()[0] is html_content
+    )
+    return html_content, last_error, from_aiohttp
+
+
 async def _fetch_with_curl_cffi(url: str, timeout: int = 15) -> Tuple[Optional[bytes], Optional[str]]:
     """
     Tenta di scaricare l'URL usando curl_cffi per bypassare controlli TLS/Bot.
     """
     print(f"Tentativo di fallback con curl_cffi per {url}...")
     try:
-        # Usa 'chrome' come impersonazione sicura e moderna
-        async with AsyncSession(impersonate="chrome") as session:
-            response = await session.get(url, timeout=timeout)
+        response = await _get_curl_session().get(url, timeout=timeout)
 
-            if response.status_code == 200:
-                return response.content, None
-            elif response.status_code in [403, 429]:
-                return None, f"curl_cffi blocked with status {response.status_code}"
-            else:
-                return None, f"curl_cffi failed with status {response.status_code}"
+        if response.status_code == 200:
+            return response.content, None
+        elif response.status_code in [403, 429]:
+            return None, f"curl_cffi blocked with status {response.status_code}"
+        else:
+            return None, f"curl_cffi failed with status {response.status_code}"
     except Exception as e:
         return None, f"curl_cffi exception: {e}"
 
@@ -209,8 +446,7 @@ async def _fetch_with_flaresolverr(url: str, timeout: int = 60) -> Tuple[Optiona
     """
     Attempts to download the URL using FlareSolverr (if configured).
     """
-    flaresolverr_url = os.getenv("FLARESOLVERR_URL")
-    if not flaresolverr_url:
+    if not FLARESOLVERR_URL:
         return None, "FlareSolverr not configured"
 
     print(f"Tentativo di fallback con FlareSolverr per {url}...")
@@ -222,25 +458,25 @@ async def _fetch_with_flaresolverr(url: str, timeout: int = 60) -> Tuple[Optiona
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                flaresolverr_url,
-                json=payload,
-                timeout=timeout + 5
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("status") == "ok":
-                        # The HTML response is in solution.response
-                        html_content = data.get("solution", {}).get("response")
-                        if html_content:
-                            return html_content.encode('utf-8'), None
-                        else:
-                            return None, "FlareSolverr returned 'ok' but no content"
+        session = _get_session()
+        async with session.post(
+            FLARESOLVERR_URL,
+            json=payload,
+            timeout=timeout + 5
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data.get("status") == "ok":
+                    # The HTML response is in solution.response
+                    html_content = data.get("solution", {}).get("response")
+                    if html_content:
+                        return html_content.encode('utf-8'), None
                     else:
-                        return None, f"FlareSolverr error: {data.get('message', 'Unknown error')}"
+                        return None, "FlareSolverr returned 'ok' but no content"
                 else:
-                    return None, f"FlareSolverr HTTP status: {response.status}"
+                    return None, f"FlareSolverr error: {data.get('message', 'Unknown error')}"
+            else:
+                return None, f"FlareSolverr HTTP status: {response.status}"
     except Exception as e:
         return None, f"FlareSolverr exception: {e}"
 
@@ -250,61 +486,26 @@ async def scrape_article(
     timeout: int = 15,
     include_images: bool = True,
     include_links: bool = True,
+    with_metadata: bool = True,
 ) -> Tuple[Optional[ArticleContent], bool, Optional[str]]:
     """
     Estrae il contenuto principale da un URL, con fallback su BeautifulSoup e curl_cffi.
+
+    ``include_images``, ``include_links`` e ``with_metadata`` vengono passati a
+    Trafilatura: disattivarli quando non servono evita parte del lavoro di parsing.
     """
     fallback_used = False
     max_retries = 3
-    html_content = None
-    last_error = None
 
-    # 1. Tentativo principale con aiohttp
-    async with aiohttp.ClientSession() as session:
-        for attempt in range(max_retries):
-            try:
-                request_headers = get_random_headers()
-                async with session.get(
-                    url, timeout=timeout, ssl=False, headers=request_headers
-                ) as response:
-                    if response.status == 429:
-                        if attempt < max_retries - 1:
-                            wait_time = random.uniform(5, 10)
-                            print(f"Attempt {attempt + 1}/{max_retries} failed (429). Retrying in {wait_time:.1f}s...")
-                            await asyncio.sleep(wait_time)
-                            continue
-
-                    # Se otteniamo 403 o 429 persistente, interrompiamo per passare a curl_cffi
-                    if response.status in [403, 429]:
-                        last_error = f"HTTP {response.status}"
-                        print(f"aiohttp bloccato con status {response.status}. Passaggio al fallback.")
-                        break
-
-                    response.raise_for_status()
-                    html_content = await response.read()
-                    last_error = None
-                    break
-
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                last_error = e
-                print(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
-                # Non ritentiamo su errori di connessione se vogliamo provare curl_cffi
-                break
+    # 1. Tentativo principale con aiohttp; se non risponde entro
+    # _HEDGE_DELAY secondi (o fallisce) parte in parallelo curl_cffi e si
+    # tiene il primo che restituisce contenuto, annullando l'altro.
+    html_content, last_error, from_aiohttp = await _fetch_hedged(
+        url, timeout, max_retries
+    )
 
-    # 2. Fallback su curl_cffi se aiohttp ha fallito (per blocchi o errori)
-    if not html_content:
-        print(f"aiohttp fallito. Avvio procedura di fallback avanzata per {url}...")
-        content, error = await _fetch_with_curl_cffi(url, timeout)
-        if content:
-            html_content = content
-            last_error = None
-            print("Fallback curl_cffi riuscito!")
-        else:
-            print(f"Anche curl_cffi ha fallito: {error}")
-            last_error = error
-
-    # 3. Fallback to FlareSolverr if curl_cffi also failed
-    if not html_content and os.getenv("FLARESOLVERR_URL"):
+    # 2. Fallback to FlareSolverr if both aiohttp and curl_cffi failed
+    if not html_content and FLARESOLVERR_URL:
         print(f"curl_cffi fallito. Avvio fallback FlareSolverr per {url}...")
         content, error = await _fetch_with_flaresolverr(url)
         if content:
@@ -327,10 +528,14 @@ async def scrape_article(
     domain = urlparse(url).netloc
     extracted_data = None
     article = None
+    # Testo decodificato, calcolato al massimo una volta e solo se serve
+    # (Trafilatura riceve i bytes e rileva da sé la codifica)
+    html_text = None
 
     if "lesswrong.com" in domain:
         print("Rilevato LessWrong, utilizzo extractor personalizzato...")
-        article = await _extract_lesswrong(html_content.decode("utf-8", errors="ignore"), url)
+        html_text = html_content.decode("utf-8", errors="ignore")
+        article = await _extract_lesswrong(html_text, url)
         if article:
              print("Estrazione custom LessWrong riuscita!")
              return article, fallback_used, None
@@ -338,42 +543,51 @@ async def scrape_article(
              print("Estrazione custom LessWrong fallita, proseguo con Trafilatura...")
 
     try:
-        extracted_data = await asyncio.to_thread(
-            trafilatura.bare_extraction,
-            html_content,
-            include_images=include_images,
-            include_links=include_links,
-            output_format="python",
-            with_metadata=True,
-        )
+        async with _TRAFILATURA_SEMAPHORE:
+            extracted_data = await _run_in_extract_pool(
+                _extract_with_trafilatura,
+                html_content,
+                include_images,
+                include_links,
+                with_metadata,
+            )
     except Exception as e:
         print(f"Errore durante l'esecuzione di Trafilatura: {e}")
         extracted_data = None
 
     article = None
-    if extracted_data and extracted_data.text and len(extracted_data.text) > 50:
+    if (
+        extracted_data
+        and extracted_data["text"]
+        and len(extracted_data["text"]) > 50
+    ):
         article = ArticleContent(
-            title=extracted_data.title or "Titolo non disponibile",
-            text=extracted_data.text,
-            author=extracted_data.author,
-            date=extracted_data.date,
+            title=extracted_data["title"] or "Titolo non disponibile",
+            text=extracted_data["text"],
+            author=extracted_data["author"],
+            date=extracted_data["date"],
             url=url,
-            description=extracted_data.description,
-            sitename=extracted_data.sitename,
-            categories=extracted_data.categories,
-            tags=extracted_data.tags,
+            description=extracted_data["description"],
+            sitename=extracted_data["sitename"],
+            categories=extracted_data["categories"],
+            tags=extracted_data["tags"],
             images=[
                 img.src
-                for img in ([extracted_data.image] if extracted_data.image else [])
+                for img in (
+                    [extracted_data["image"]] if extracted_data["image"] else []
+                )
                 if hasattr(img, "src") and img.src
             ],
+            plain_fetch=from_aiohttp,
         )
     else:
         # 4. Fallback BeautifulSoup
         print("Trafilatura insufficiente. Tentativo fallback BeautifulSoup...")
         fallback_used = True
-        fallback_content = await _scrape_with_beautifulsoup(
-            html_content.decode("utf-8", errors="ignore")
+        if html_text is None:
+            html_text = html_content.decode("utf-8", errors="ignore")
+        fallback_content = await _run_in_extract_pool(
+            _scrape_with_beautifulsoup, html_text
         )
 
         if fallback_content and fallback_content.get("text"):
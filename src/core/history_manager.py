@@ -1,57 +1,180 @@
-import json
 import os
-from typing import Dict, List, Any
+import threading
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Any, Set, Tuple
+
+from core import jsonio
 
 HISTORY_DIR = "src/data/history"
 MAX_HISTORY_SIZE = 100000
 
+# Number of appended log entries after which the log is merged into the snapshot
+LOG_COMPACT_THRESHOLD = 500
+
+# Parsed histories keyed on the (mtime_ns, size) of the snapshot and the log:
+# user_id -> (files_key, history deque, log entry count, URL index). The set of
+# URLs gives O(1) duplicate checks and is invalidated along with the history.
+_CACHE: Dict[int, Tuple[tuple, deque, int, Set[str]]] = {}
+
+# add_to_history runs in worker threads while the handlers read and rewrite the
+# history: the caches above, the cached deques and the files are only touched
+# under this lock (reentrant: add_to_history may call save_history)
+_lock = threading.RLock()
+
 
 def _get_history_filepath(user_id: int) -> str:
     """Constructs the file path for a user's history file."""
     return os.path.join(HISTORY_DIR, f"{user_id}.json")
 
 
-def load_history(user_id: int) -> List[Dict[str, Any]]:
-    """Loads the history for a given user."""
-    filepath = _get_history_filepath(user_id)
-    if not os.path.exists(filepath):
+def _get_log_filepath(user_id: int) -> str:
+    """Constructs the file path for a user's append-only history log."""
+    return os.path.join(HISTORY_DIR, f"{user_id}.jsonl")
+
+
+def _read_log(user_id: int) -> List[Dict[str, Any]]:
+    """Reads the entries appended since the last snapshot (oldest first)."""
+    log_path = _get_log_filepath(user_id)
+    if not os.path.exists(log_path):
         return []
+    entries = []
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
+        with open(log_path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(jsonio.loads(line))
+                except jsonio.JSONDecodeError:
+                    # A partially written last line (e.g. crash during append)
+                    continue
+    except IOError:
         return []
+    return entries
 
 
-def save_history(user_id: int, history: List[Dict[str, Any]]) -> None:
-    """Saves the history for a given user."""
-    os.makedirs(HISTORY_DIR, exist_ok=True)
+def _stat_key(path: str):
+    """Returns (mtime_ns, size) for ``path``, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _files_key(user_id: int) -> tuple:
+    """Cache key describing the current state of the user's history files."""
+    return (
+        _stat_key(_get_history_filepath(user_id)),
+        _stat_key(_get_log_filepath(user_id)),
+    )
+
+
+def _load_entries(user_id: int) -> Tuple[deque, int, Set[str]]:
+    """
+    Loads the snapshot merged with the append log.
+
+    Returns the history (a deque bounded to MAX_HISTORY_SIZE, most recent
+    first), the number of log entries and the set of URLs in the history.
+    The parsed result is cached until one of the files changes on disk.
+    """
+    key = _files_key(user_id)
+    cached = _CACHE.get(user_id)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2], cached[3]
+
+    history = []
     filepath = _get_history_filepath(user_id)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(history, f, ensure_ascii=False, indent=4)
+    if os.path.exists(filepath):
+        try:
+            with open(filepath, "rb") as f:
+                history = jsonio.loads(f.read())
+        except (jsonio.JSONDecodeError, IOError):
+            history = []
+
+    # The deque's maxlen evicts the oldest entries (right end) when the
+    # log entries are pushed on the left: no list copies or slicing
+    history = deque(islice(history, MAX_HISTORY_SIZE), maxlen=MAX_HISTORY_SIZE)
+    log_entries = _read_log(user_id)
+    history.extendleft(log_entries)
+    url_index = {entry.get("url") for entry in history}
+    _CACHE[user_id] = (key, history, len(log_entries), url_index)
+    return history, len(log_entries), url_index
+
+
+def load_history(user_id: int) -> List[Dict[str, Any]]:
+    """Loads the history for a given user."""
+    with _lock:
+        return list(_load_entries(user_id)[0])
+
+
+def save_history(user_id: int, history: List[Dict[str, Any]]) -> None:
+    """Saves the history for a given user (compacting the append log)."""
+    with _lock:
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        filepath = _get_history_filepath(user_id)
+        # Payload built in memory and written with a single write() to a
+        # temporary file, then swapped in atomically: a crash never leaves a
+        # truncated history. No indent: pretty-printing doubles the file size
+        # and the write time.
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(jsonio.dumps(history))
+        os.replace(tmp_path, filepath)
+        _CACHE.pop(user_id, None)
+
+        # The snapshot now contains every logged entry
+        log_path = _get_log_filepath(user_id)
+        if os.path.exists(log_path):
+            os.remove(log_path)
 
 
 def add_to_history(user_id: int, url: str, summary: str, hashtags: List[str]) -> None:
     """Adds a new entry to the user's history, avoiding duplicates."""
-    history = load_history(user_id)
+    with _lock:
+        # Duplicate check on the cached URL index (two stats, no parsing)
+        history, log_count, url_index = _load_entries(user_id)
+        if url in url_index:
+            return
+
+        new_entry = {
+            "url": url,
+            "summary": summary,
+            "hashtags": hashtags,
+        }
+
+        if log_count + 1 >= LOG_COMPACT_THRESHOLD:
+            # Merge the log into the snapshot, most recent first,
+            # keeping only the most recent MAX_HISTORY_SIZE entries
+            history.appendleft(new_entry)
+            save_history(user_id, list(history))
+            return
 
-    # Check for duplicate URLs
-    if any(entry.get("url") == url for entry in history):
-        return
+        # Append-only: a single line write instead of rewriting the whole file
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        with open(_get_log_filepath(user_id), "ab") as f:
+            f.write(jsonio.dumps(new_entry) + b"\n")
 
-    new_entry = {
-        "url": url,
-        "summary": summary,
-        "hashtags": hashtags,
-    }
+        url_index.add(url)
+        if len(history) == MAX_HISTORY_SIZE:
+            # The oldest entry falls out of the history window
+            url_index.discard(history[-1].get("url"))
 
-    # Add new entry at the beginning (FIFO: most recent first)
-    history.insert(0, new_entry)
+        # Keep the cached copy in step with the log instead of re-parsing it
+        history.appendleft(new_entry)
+        _CACHE[user_id] = (_files_key(user_id), history, log_count + 1, url_index)
 
-    # Enforce history size limit - remove oldest entries if limit exceeded
-    if len(history) > MAX_HISTORY_SIZE:
-        # Keep only the most recent MAX_HISTORY_SIZE entries
-        # This removes the oldest entries from the end of the list
-        history = history[:MAX_HISTORY_SIZE]
 
-    save_history(user_id, history)
+def update_hashtags(user_id: int, url: str, hashtags: List[str]) -> None:
+    """Replaces the hashtags of the history entry for ``url``, if any."""
+    # Read-modify-write under the lock: no entry appended in the meantime is lost
+    with _lock:
+        history = load_history(user_id)
+        for entry in history:
+            if entry.get("url") == url:
+                entry["hashtags"] = hashtags
+                break
+        else:
+            return
+        save_history(user_id, history)
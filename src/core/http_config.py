@@ -3,14 +3,13 @@ Configuration for HTTP requests, including headers and user agents.
 """
 
 import random
+from types import MappingProxyType
 
-
-def get_random_headers():
-    """
-    Returns a complete and consistent set of headers for a random browser.
-    """
-    # Headers from various real browsers
-    browser_headers = [
+# Headers from various real browsers, built once at import.
+# Shared between requests, hence wrapped in read-only mappings.
+_BROWSER_HEADERS = tuple(
+    MappingProxyType(headers)
+    for headers in (
         # Chrome on Windows 10
         {
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
@@ -66,5 +65,12 @@ def get_random_headers():
             "Upgrade-Insecure-Requests": "1",
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36",
         },
-    ]
-    return random.choice(browser_headers)
+    )
+)
+
+
+def get_random_headers():
+    """
+    Returns a complete and consistent set of headers for a random browser.
+    """
+    return random.choice(_BROWSER_HEADERS)
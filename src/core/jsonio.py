@@ -0,0 +1,29 @@
+"""
+Serializzazione JSON veloce: usa orjson se installato, altrimenti la libreria
+standard ``json`` con un output equivalente (UTF-8, senza indentazione).
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson è opzionale
+    orjson = None
+
+# orjson.JSONDecodeError è una sottoclasse di json.JSONDecodeError
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Deserializza JSON da bytes o str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializza ``obj`` in JSON compatto, codificato UTF-8."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,93 @@
+"""
+Persistent cache of LLM responses, stored in SQLite (standard library only).
+
+Identical requests (same provider, model, sampling parameters and prompts) are
+answered from disk instead of calling the provider again: no network round-trip,
+no rate-limit wait and no token spend.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import LLM_CACHE_PATH
+from core import jsonio
+
+# Expired rows are purged every this many writes
+_PURGE_EVERY = 100
+
+_conn: Optional[sqlite3.Connection] = None
+_writes = 0
+# Reads and writes run in worker threads (asyncio.to_thread): one shared
+# connection, serialized by this lock
+_lock = threading.Lock()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens the cache database on first use."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        _conn = conn
+    return _conn
+
+
+def make_key(*parts: Any) -> str:
+    """Returns the cache key (BLAKE2b hex digest) of the request ``parts``."""
+    digest = hashlib.blake2b(digest_size=32)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        # Unit separator: ("ab", "c") and ("a", "bc") get different keys
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Returns the cached response for ``key``, or None if missing or expired."""
+    with _lock:
+        try:
+            row = (
+                _get_conn()
+                .execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                )
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            print(f"LLM cache read error: {e}")
+            return None
+    if row is None or row[1] < time.time():
+        return None
+    return jsonio.loads(row[0])
+
+
+def put(key: str, value: Dict[str, Any], ttl: float) -> None:
+    """Stores ``value`` under ``key`` for ``ttl`` seconds (``ttl <= 0`` disables)."""
+    global _writes
+    if ttl <= 0:
+        return
+    payload = jsonio.dumps(value)
+    now = time.time()
+    with _lock:
+        try:
+            conn = _get_conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)",
+                    (key, payload, now + ttl),
+                )
+                _writes += 1
+                if _writes % _PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        except sqlite3.Error as e:
+            print(f"LLM cache write error: {e}")
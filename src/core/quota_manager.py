@@ -2,19 +2,88 @@
 Module for managing API quotas and models for Google Gemini, Groq, and OpenRouter.
 """
 
+import atexit
+import bisect
+import hashlib
 import json
 import os
+import functools
 import time
 import requests
-from threading import RLock
-from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, RLock, Thread
+from datetime import datetime
 from typing import Dict, List, Any, Optional
 
-from config import GROQ_API_KEY, OPENROUTER_API_KEY
-
-request_timestamps = {}
-QUOTA_FILE = os.path.join("src", "data", "quota.json")
+from config import GROQ_API_KEY, OPENROUTER_API_KEY, QUOTA_FILE_PATH
+from core import jsonio
+
+# Sliding window of recent (or reserved) request times per "provider:model",
+# kept sorted: reservations may lie in the future
+request_timestamps: Dict[str, List[float]] = {}
+# (request time, estimated tokens) reserved in the last minute per
+# "provider:model", for the TPM limit
+token_reservations: Dict[str, List[tuple]] = {}
+# Single source of truth for the path: shared with config.load_available_models
+QUOTA_FILE = QUOTA_FILE_PATH
+# Append-only log of usage records (one JSON object per line), merged into
+# quota.json on compaction instead of rewriting the whole file on every call
+USAGE_LOG_FILE = os.path.join(os.path.dirname(QUOTA_FILE), "usage.log")
+# Rate-limit windows in seconds (usage timestamps are epoch floats)
+MINUTE_WINDOW = 60.0
+DAY_WINDOW = 86400.0
+# Number of appended usage records after which the log is compacted
+USAGE_LOG_COMPACT_EVERY = 200
+_usage_appends = 0
+# Guards the shared quota data, its files and the usage log
 lock = RLock()
+# Striped locks for the per-model request windows: rate-limit checks on
+# different models neither wait on each other nor on the quota file I/O
+_STRIPE_COUNT = 16
+_stripe_locks = tuple(Lock() for _ in range(_STRIPE_COUNT))
+
+# In-memory copy of quota.json (plus replayed usage log). Reloaded only when the
+# file changes on disk; changes are written back by a background thread.
+_quota_cache: Optional[Dict[str, Any]] = None
+_quota_mtime: Optional[int] = None
+# Set by save_quota_data, cleared once the cache has been written back
+_quota_dirty = Event()
+_flush_thread: Optional[Thread] = None
+# Digest of the payload last written to quota.json (None: unknown, e.g. the
+# file was loaded from disk), to skip rewriting identical contents
+_quota_digest: Optional[bytes] = None
+# Debounce delay: a burst of saves within this window is written only once
+FLUSH_DELAY = 1.0
+# (provider, model) as passed by the caller -> (window key, RPM limit, TPM limit).
+# Emptied whenever the quota data is saved or reloaded, so the rate-limit check does not
+# touch the quota data (nor stat quota.json) on every request
+_rate_limits: Dict[tuple, tuple] = {}
+
+
+def _create_http_session() -> requests.Session:
+    """
+    HTTP session shared by the Groq/OpenRouter API calls: keep-alive connections
+    are reused across calls, and transient errors are retried with backoff
+    (honouring the Retry-After header on 429/503).
+    """
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=10, max_retries=retry))
+    return session
+
+
+_http_session = _create_http_session()
+# Runs the independent Groq/OpenRouter API calls concurrently
+_io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quota-io")
 
 
 class QuotaExceededError(Exception):
@@ -83,13 +152,16 @@ def initialize_quota_file():
             },
         },
         "groq": {},
-        "openrouter": {},
+        # OpenRouter: only the model ids, usage entries are added on first use
+        "openrouter": {"models": [], "usage": {}},
     }
 
-    # Fetch models from APIs
+    # Fetch models from APIs (both requests in flight at the same time)
+    groq_future = _io_executor.submit(fetch_groq_models)
+    openrouter_future = _io_executor.submit(fetch_openrouter_models)
     try:
         if GROQ_API_KEY:
-            groq_models = fetch_groq_models()
+            groq_models = groq_future.result()
             for model in groq_models:
                 # Default Groq Free Tier limits (approximate/conservative)
                 default_quota_data["groq"][model] = {
@@ -103,45 +175,389 @@ def initialize_quota_file():
 
     try:
         if OPENROUTER_API_KEY:
-            openrouter_models = fetch_openrouter_models()
-            for model in openrouter_models:
-                default_quota_data["openrouter"][model] = {"usage_timestamps": []}
+            openrouter_models = openrouter_future.result()
+            default_quota_data["openrouter"]["models"] = sorted(openrouter_models)
     except Exception as e:
         print(f"Error initializing OpenRouter models: {e}")
 
-    # Create directory if not exists
-    os.makedirs(os.path.dirname(QUOTA_FILE), exist_ok=True)
-
     # Save data
-    with open(QUOTA_FILE, "w", encoding="utf-8") as f:
-        json.dump(default_quota_data, f, indent=4)
+    # A freshly created file is pretty-printed, meant to be read/edited by hand
+    _atomic_write(QUOTA_FILE, _serialize(default_quota_data, pretty=True))
 
     print(f"✅ File {QUOTA_FILE} initialized successfully!")
     return default_quota_data
 
 
-def get_quota_data():
-    """Reads quota data from JSON file."""
-    with lock:
+def _serialize(data: Dict[str, Any], pretty: bool = False) -> bytes:
+    """
+    Encodes the quota data in memory, to be written with a single write() call.
+
+    The write-backs use the compact form (orjson when available); ``pretty``
+    indents the output and is only meant for explicit dumps.
+    """
+    if pretty:
+        return json.dumps(data, indent=4).encode("utf-8")
+    return jsonio.dumps(data)
+
+
+def _atomic_write(path: str, payload: bytes):
+    """
+    Writes ``payload`` to a temporary file, syncs it to disk and renames it over
+    ``path``: a crash mid-write leaves the previous file intact instead of a
+    truncated one (which would be re-initialized, wiping the quota state).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _to_epoch(timestamp) -> float:
+    """Converts a legacy ISO 8601 timestamp to epoch seconds (floats pass through)."""
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp).timestamp()
+    return timestamp
+
+
+def _migrate_openrouter(data: Dict[str, Any]) -> bool:
+    """
+    Converts the legacy OpenRouter section (one ``{model_id: {...}}`` entry per
+    model, mostly empty) to ``{"models": [ids], "usage": {model_id: {...}}}``.
+
+    Returns True if it was converted.
+    """
+    section = data.get("openrouter")
+    if not isinstance(section, dict) or "models" in section:
+        return False
+    data["openrouter"] = {
+        "models": sorted(section),
+        "usage": {m: d for m, d in section.items() if d.get("usage_timestamps")},
+    }
+    return True
+
+
+def _usage_entries(data: Dict[str, Any]):
+    """Yields the per-model dicts holding usage records, for every provider."""
+    for provider in ("gemini", "groq"):
+        yield from data.get(provider, {}).values()
+    yield from data.get("openrouter", {}).get("usage", {}).values()
+
+
+def _has_model(data: Dict[str, Any], provider: str, model_name: str) -> bool:
+    """Whether ``model_name`` is a known model of ``provider``."""
+    if provider == "openrouter":
+        return model_name in data.get("openrouter", {}).get("models", ())
+    return model_name in data.get(provider, {})
+
+
+def _resolve_provider(data: Dict[str, Any], model_name: str, provider: str) -> str:
+    """
+    Returns the provider actually serving ``model_name``.
+
+    Legacy callers pass the default "gemini" for every model: when the model is
+    not a Gemini one, it is looked up among the Groq and OpenRouter models.
+    """
+    if provider == "gemini" and model_name not in data.get("gemini", {}):
+        if model_name in data.get("groq", {}):
+            return "groq"
+        if _has_model(data, "openrouter", model_name):
+            return "openrouter"
+    return provider
+
+
+def _model_data(
+    data: Dict[str, Any], provider: str, model_name: str, create: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns the entry of a model, or None if the model is unknown.
+
+    OpenRouter entries only exist once the model has been used: without
+    ``create`` an empty dict is returned for them, otherwise it is added.
+    """
+    if provider != "openrouter":
+        return data.get(provider, {}).get(model_name)
+    section = data.get("openrouter", {})
+    usage = section.get("usage", {})
+    if model_name in usage:
+        return usage[model_name]
+    if model_name not in section.get("models", ()):
+        return None
+    if not create:
+        return {}
+    return section.setdefault("usage", {}).setdefault(model_name, {})
+
+
+def _migrate_usage(data: Dict[str, Any]) -> bool:
+    """
+    Converts legacy usage records in place to the parallel-list layout.
+
+    ``usage_timestamps`` was a list of ``{"timestamp", "tokens"}`` dicts (with
+    ISO 8601 timestamps in older files); it is now a list of epoch seconds,
+    with the token counts at the same positions in ``usage_tokens``.
+    Returns True if anything was converted.
+    """
+    migrated = False
+    for model_data in _usage_entries(data):
+        timestamps = model_data.get("usage_timestamps")
+        if not timestamps:
+            continue
+        if isinstance(timestamps[0], dict):
+            # Sorted by time, as the window pruning relies on it
+            records = sorted(
+                (_to_epoch(r["timestamp"]), r.get("tokens", 0)) for r in timestamps
+            )
+            model_data["usage_timestamps"] = [t for t, _ in records]
+            model_data["usage_tokens"] = [tok for _, tok in records]
+            migrated = True
+        elif len(model_data.get("usage_tokens", ())) != len(timestamps):
+            model_data["usage_tokens"] = [0] * len(timestamps)
+            migrated = True
+    return migrated
+
+
+def _usage_lists(model_data: Dict[str, Any]):
+    """Returns the model's (usage_timestamps, usage_tokens) lists, creating them."""
+    return (
+        model_data.setdefault("usage_timestamps", []),
+        model_data.setdefault("usage_tokens", []),
+    )
+
+
+def _count_since(timestamps: List[float], since: float) -> int:
+    """Number of requests at or after ``since`` in a time-sorted list (O(log n))."""
+    return len(timestamps) - bisect.bisect_left(timestamps, since)
+
+
+def _prune_usage(timestamps: List[float], tokens: List[int], cutoff: float) -> None:
+    """Drops the usage records at or before ``cutoff`` from both lists."""
+    # Records are appended in time order: binary search for the first one
+    # inside the window and drop the prefix in place
+    idx = bisect.bisect_right(timestamps, cutoff)
+    if idx:
+        del timestamps[:idx]
+        del tokens[:idx]
+
+
+def _window_counts(timestamps: List[float], minute_ago: float, day_ago: float):
+    """
+    Returns the (last minute, last 24h) request counts of a time-sorted list.
+
+    The minute search starts from the day boundary, so both counts cost two
+    binary searches over the records of the last 24h only.
+    """
+    day_start = bisect.bisect_left(timestamps, day_ago)
+    minute_start = bisect.bisect_left(timestamps, minute_ago, lo=day_start)
+    return len(timestamps) - minute_start, len(timestamps) - day_start
+
+
+def _replay_usage_log(data: Dict[str, Any]) -> None:
+    """
+    Merges the usage records of the append-only log into ``data``.
+
+    Records already present (same timestamp) are skipped, so replaying a log
+    that was partially compacted never counts a request twice. Records are
+    inserted in time order (the log may predate the snapshot's newest entries)
+    and the lists are then pruned to the last 24h, as the window counts and
+    the pruning binary-search them.
+    """
+    try:
+        with open(USAGE_LOG_FILE, "rb") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return
+
+    seen = {}
+    # (provider, model) -> its usage lists, for the final pruning
+    touched = {}
+    for line in lines:
         try:
-            with open(QUOTA_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"⚠️  File {QUOTA_FILE} not found. Initializing...")
-            return initialize_quota_file()
-        except json.JSONDecodeError:
-            print(f"⚠️  Error parsing {QUOTA_FILE}. Re-initializing...")
-            return initialize_quota_file()
+            record = jsonio.loads(line)
+            provider, model_name = record["p"], record["m"]
+        except (jsonio.JSONDecodeError, KeyError, TypeError):
+            continue  # Partially written line
+
+        model_data = _model_data(data, provider, model_name, create=True)
+        if model_data is None:
+            continue
+        timestamps, tokens = _usage_lists(model_data)
+
+        key = (provider, model_name)
+        if key not in seen:
+            seen[key] = set(timestamps)
+        timestamp = _to_epoch(record["t"])
+        if timestamp in seen[key]:
+            continue
+        seen[key].add(timestamp)
+        # Usually the tail, but not always: keep both lists sorted and aligned
+        idx = bisect.bisect_right(timestamps, timestamp)
+        timestamps.insert(idx, timestamp)
+        tokens.insert(idx, record["tok"])
+        touched[key] = (timestamps, tokens)
+
+    cutoff = time.time() - DAY_WINDOW
+    for timestamps, tokens in touched.values():
+        _prune_usage(timestamps, tokens, cutoff)
+
+
+def _lock_for(key: str) -> Lock:
+    """Returns the stripe lock guarding the request window of ``key``."""
+    return _stripe_locks[hash(key) % _STRIPE_COUNT]
+
+
+def _file_mtime() -> Optional[int]:
+    """Returns the quota file's mtime in ns, or None if it does not exist."""
+    try:
+        return os.stat(QUOTA_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_quota_data(reinitialize: bool = True):
+    """
+    Returns the quota data (including the pending usage log).
+
+    The returned dict is the shared in-memory copy: it is re-read from disk only
+    when quota.json changes, and modifications must go through save_quota_data.
+
+    A missing or unparsable quota.json is re-initialized (provider API calls,
+    stored usage lost); with ``reinitialize=False`` the FileNotFoundError or
+    JSONDecodeError is raised instead.
+    """
+    with lock:
+        return _get_quota_data_unlocked(reinitialize)
+
+
+def _get_quota_data_unlocked(reinitialize: bool = True):
+    """get_quota_data for callers already holding ``lock``."""
+    global _quota_cache, _quota_mtime, _quota_digest
+    if _quota_cache is not None and (
+        _quota_dirty.is_set() or _file_mtime() == _quota_mtime
+    ):
+        return _quota_cache
+
+    try:
+        with open(QUOTA_FILE, "rb") as f:
+            data = jsonio.loads(f.read())
+    except FileNotFoundError:
+        if not reinitialize:
+            raise
+        print(f"⚠️  File {QUOTA_FILE} not found. Initializing...")
+        data = initialize_quota_file()
+    except jsonio.JSONDecodeError:
+        if not reinitialize:
+            raise
+        print(f"⚠️  Error parsing {QUOTA_FILE}. Re-initializing...")
+        data = initialize_quota_file()
+    # Both migrations always run ("|" does not short-circuit)
+    migrated = _migrate_openrouter(data) | _migrate_usage(data)
+    _replay_usage_log(data)
+
+    _quota_cache = data
+    _quota_mtime = _file_mtime()
+    _quota_digest = None
+    _rate_limits.clear()
+    if migrated:
+        # Persist the converted usage records once
+        _save_quota_data_unlocked(data)
+    return data
 
 
 def save_quota_data(data):
-    """Saves quota data to JSON file."""
+    """Stores quota data; the file is written back by the flush thread."""
+    with lock:
+        _save_quota_data_unlocked(data)
+
+
+def _save_quota_data_unlocked(data):
+    """save_quota_data for callers already holding ``lock``."""
+    global _quota_cache
+    _quota_cache = data
+    _rate_limits.clear()
+    _quota_dirty.set()
+    _start_flush_thread()
+
+
+def flush_quota_data():
+    """
+    Writes the cached quota data to disk if it was modified.
+
+    The snapshot then contains every logged usage record, so the usage log
+    is emptied as well.
+    """
+    global _quota_mtime, _quota_digest, _usage_appends
     with lock:
-        os.makedirs(os.path.dirname(QUOTA_FILE), exist_ok=True)
-        with open(QUOTA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
+        if not _quota_dirty.is_set() or _quota_cache is None:
+            return
+        payload = _serialize(_quota_cache)
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        # Saves that did not change anything (same limits, same models) leave
+        # quota.json untouched: no write, no fsync
+        if digest != _quota_digest:
+            _atomic_write(QUOTA_FILE, payload)
+            _quota_mtime = _file_mtime()
+            _quota_digest = digest
+        _quota_dirty.clear()
+
+        if os.path.exists(USAGE_LOG_FILE):
+            open(USAGE_LOG_FILE, "w").close()
+        _usage_appends = 0
+
+
+def _flush_worker():
+    """Background writer: sleeps until the cache is modified, then flushes it."""
+    while True:
+        _quota_dirty.wait()
+        # Let further saves of the same burst land before writing
+        time.sleep(FLUSH_DELAY)
+        try:
+            flush_quota_data()
+        except Exception as e:
+            print(f"Error writing {QUOTA_FILE}: {e}")
+
+
+def _start_flush_thread():
+    """Starts the write-back thread on first use."""
+    global _flush_thread
+    if _flush_thread is None:
+        _flush_thread = Thread(target=_flush_worker, name="quota-flush", daemon=True)
+        _flush_thread.start()
+
+
+# Pending changes are written on interpreter exit as well
+atexit.register(flush_quota_data)
+
+
+def _ttl_cache(seconds: float):
+    """
+    Memoizes a no-argument API call for ``seconds``.
+
+    Empty results (missing key, network or HTTP error) are not cached, so a
+    failed call is retried on the next use. ``fn.cache_clear()`` drops the value.
+    """
+
+    def decorator(fn):
+        cache: Dict[str, Any] = {}
+
+        @functools.wraps(fn)
+        def wrapper():
+            now = time.monotonic()
+            if "value" in cache and now - cache["time"] < seconds:
+                return cache["value"]
+            value = fn()
+            if value:
+                cache.update(value=value, time=now)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
 
+    return decorator
 
+
+@_ttl_cache(300)
 def fetch_groq_models() -> List[str]:
     """Fetches available models from Groq API."""
     if not GROQ_API_KEY:
@@ -154,15 +570,16 @@ def fetch_groq_models() -> List[str]:
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _http_session.get(url, headers=headers, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = jsonio.loads(response.content)
         return [model["id"] for model in data.get("data", [])]
     except Exception as e:
         print(f"Error fetching Groq models: {e}")
         return []
 
 
+@_ttl_cache(300)
 def fetch_openrouter_models() -> List[str]:
     """Fetches available :free models from OpenRouter API."""
     if not OPENROUTER_API_KEY:
@@ -171,9 +588,11 @@ def fetch_openrouter_models() -> List[str]:
     url = "https://openrouter.ai/api/v1/models"
 
     try:
-        response = requests.get(url, timeout=10)
+        # The full catalogue is several hundred KB: the session already asks for
+        # a gzip-compressed body, and the raw bytes are parsed by jsonio
+        response = _http_session.get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = jsonio.loads(response.content)
         # Filter only :free models as per user requirement
         models = [
             model["id"]
@@ -186,6 +605,7 @@ def fetch_openrouter_models() -> List[str]:
         return []
 
 
+@_ttl_cache(60)
 def get_openrouter_quota_info() -> Dict[str, Any]:
     """Fetches quota/credit info from OpenRouter."""
     if not OPENROUTER_API_KEY:
@@ -195,15 +615,26 @@ def get_openrouter_quota_info() -> Dict[str, Any]:
     headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}"}
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _http_session.get(url, headers=headers, timeout=10)
         if response.status_code == 200:
-            return response.json().get("data", {})
+            return jsonio.loads(response.content).get("data", {})
         return {}
     except Exception as e:
         print(f"Error checking OpenRouter quota: {e}")
         return {}
 
 
+# Groq rate-limit response header -> (model field, parsed as int)
+_GROQ_RATE_LIMIT_HEADERS = {
+    "x-ratelimit-limit-requests": ("requests_per_minute", True),
+    "x-ratelimit-remaining-requests": ("remaining_requests", True),
+    "x-ratelimit-limit-tokens": ("tokens_per_minute", True),
+    "x-ratelimit-remaining-tokens": ("remaining_tokens", True),
+    "x-ratelimit-reset-requests": ("reset_requests", False),
+    "x-ratelimit-reset-tokens": ("reset_tokens", False),
+}
+
+
 def update_groq_rate_limits(model_name: str, headers: dict):
     """
     Updates Groq rate limits from response headers.
@@ -212,50 +643,31 @@ def update_groq_rate_limits(model_name: str, headers: dict):
     - x-ratelimit-limit-tokens / x-ratelimit-remaining-tokens
     - x-ratelimit-reset-requests / x-ratelimit-reset-tokens
     """
-    with lock:
-        data = get_quota_data()
-        if "groq" not in data or model_name not in data["groq"]:
-            return
-
-        model_data = data["groq"][model_name]
-
-        # Parse headers (case-insensitive)
-        headers_lower = {k.lower(): v for k, v in headers.items()}
-
-        if "x-ratelimit-limit-requests" in headers_lower:
+    # Parse headers (case-insensitive) before taking the lock
+    headers_lower = {k.lower(): v for k, v in headers.items()}
+    updates = {}
+    for header, (field, is_int) in _GROQ_RATE_LIMIT_HEADERS.items():
+        value = headers_lower.get(header)
+        if value is None:
+            continue
+        if is_int:
             try:
-                model_data["requests_per_minute"] = int(
-                    headers_lower["x-ratelimit-limit-requests"]
-                )
+                value = int(value)
             except ValueError:
-                pass
-        if "x-ratelimit-remaining-requests" in headers_lower:
-            try:
-                model_data["remaining_requests"] = int(
-                    headers_lower["x-ratelimit-remaining-requests"]
-                )
-            except ValueError:
-                pass
-        if "x-ratelimit-limit-tokens" in headers_lower:
-            try:
-                model_data["tokens_per_minute"] = int(
-                    headers_lower["x-ratelimit-limit-tokens"]
-                )
-            except ValueError:
-                pass
-        if "x-ratelimit-remaining-tokens" in headers_lower:
-            try:
-                model_data["remaining_tokens"] = int(
-                    headers_lower["x-ratelimit-remaining-tokens"]
-                )
-            except ValueError:
-                pass
-        if "x-ratelimit-reset-requests" in headers_lower:
-            model_data["reset_requests"] = headers_lower["x-ratelimit-reset-requests"]
-        if "x-ratelimit-reset-tokens" in headers_lower:
-            model_data["reset_tokens"] = headers_lower["x-ratelimit-reset-tokens"]
+                continue
+        updates[field] = value
+    if not updates:
+        return
 
-        save_quota_data(data)
+    with lock:
+        data = _get_quota_data_unlocked()
+        model_data = data.get("groq", {}).get(model_name)
+        if model_data is None:
+            return
+        # Unchanged limits (the common case) are not saved again
+        if any(model_data.get(k) != v for k, v in updates.items()):
+            model_data.update(updates)
+            _save_quota_data_unlocked(data)
 
 
 def update_openrouter_limits():
@@ -265,7 +677,7 @@ def update_openrouter_limits():
         return
 
     with lock:
-        data = get_quota_data()
+        data = _get_quota_data_unlocked()
         data["openrouter_limits"] = {
             "limit": info.get("limit"),
             "limit_remaining": info.get("limit_remaining"),
@@ -273,17 +685,30 @@ def update_openrouter_limits():
             "usage_daily": info.get("usage_daily", 0),
             "is_free_tier": info.get("is_free_tier", True),
         }
-        save_quota_data(data)
+        _save_quota_data_unlocked(data)
 
 
 def sync_models():
     """Updates the quota file with currently available models."""
-    data = get_quota_data()
+    # Both model lists are fetched concurrently: wall time is the slower call
+    groq_future = _io_executor.submit(fetch_groq_models)
+    openrouter_future = _io_executor.submit(fetch_openrouter_models)
+
+    # Results are awaited before taking the lock: no HTTP wait while holding it
+    fetched_groq = groq_future.result() if GROQ_API_KEY else []
+    fetched_or = openrouter_future.result() if OPENROUTER_API_KEY else []
+
+    with lock:
+        _merge_fetched_models(fetched_groq, fetched_or)
+
+
+def _merge_fetched_models(fetched_groq: List[str], fetched_or: List[str]):
+    """Adds the newly fetched models to the quota data (``lock`` held)."""
+    data = _get_quota_data_unlocked()
     updated = False
 
     if GROQ_API_KEY:
         current_groq = data.get("groq", {})
-        fetched_groq = fetch_groq_models()
         for model in fetched_groq:
             if model not in current_groq:
                 current_groq[model] = {
@@ -296,62 +721,90 @@ def sync_models():
         data["groq"] = current_groq
 
     if OPENROUTER_API_KEY:
-        current_or = data.get("openrouter", {})
-        fetched_or = fetch_openrouter_models()
-        for model in fetched_or:
-            if model not in current_or:
-                current_or[model] = {"usage_timestamps": []}
-                updated = True
-        data["openrouter"] = current_or
+        current_or = data.setdefault("openrouter", {"models": [], "usage": {}})
+        models = sorted(set(current_or.get("models", [])).union(fetched_or))
+        if models != current_or.get("models"):
+            current_or["models"] = models
+            updated = True
 
     if updated:
-        save_quota_data(data)
+        _save_quota_data_unlocked(data)
 
 
 def update_model_usage(model_name: str, token_count: int, provider: str = "gemini"):
     """
     Updates usage for a model.
     """
+    # One lock acquisition for the whole update: the helpers below are the
+    # _unlocked variants, which do not re-enter the RLock
     with lock:
-        data = get_quota_data()
-
-        # Handle provider detection if not explicit (legacy support)
-        if provider == "gemini" and model_name not in data.get("gemini", {}):
-            # Try to find model in other providers
-            if model_name in data.get("groq", {}):
-                provider = "groq"
-            elif model_name in data.get("openrouter", {}):
-                provider = "openrouter"
-
-        if provider in data and model_name in data[provider]:
-            if "usage_timestamps" not in data[provider][model_name]:
-                data[provider][model_name]["usage_timestamps"] = []
-
-            usage_record = {
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "tokens": token_count,
+        data = _get_quota_data_unlocked()
+
+        provider = _resolve_provider(data, model_name, provider)
+        model_data = _model_data(data, provider, model_name, create=True)
+        if model_data is not None:
+            # A single small line appended instead of rewriting quota.json
+            record = {
+                "p": provider,
+                "m": model_name,
+                "t": time.time(),
+                "tok": token_count,
             }
-            data[provider][model_name]["usage_timestamps"].append(usage_record)
-
-            # Keep only last 24h of history to prevent file bloat
-            now = datetime.now(timezone.utc)
-            data[provider][model_name]["usage_timestamps"] = [
-                r
-                for r in data[provider][model_name]["usage_timestamps"]
-                if now - datetime.fromisoformat(r["timestamp"]) < timedelta(days=1)
-            ]
+            os.makedirs(os.path.dirname(USAGE_LOG_FILE), exist_ok=True)
+            with open(USAGE_LOG_FILE, "ab") as f:
+                f.write(jsonio.dumps(record) + b"\n")
+
+            # Keep the in-memory copy in step with the log, bounded to the
+            # last 24h: the lists never grow between two compactions
+            timestamps, tokens = _usage_lists(model_data)
+            timestamps.append(record["t"])
+            tokens.append(token_count)
+            _prune_usage(timestamps, tokens, record["t"] - DAY_WINDOW)
 
-            save_quota_data(data)
+            global _usage_appends
+            _usage_appends += 1
+            if _usage_appends >= USAGE_LOG_COMPACT_EVERY:
+                _compact_usage_log_unlocked()
+
+
+def compact_usage_log():
+    """
+    Merges the usage log into quota.json, keeping only the last 24h of
+    history to prevent file bloat, then empties the log.
+    """
+    with lock:
+        _compact_usage_log_unlocked()
+
+
+def _compact_usage_log_unlocked():
+    """compact_usage_log for callers already holding ``lock``."""
+    global _usage_appends
+    data = _get_quota_data_unlocked()
+    cutoff = time.time() - DAY_WINDOW
+    for model_data in _usage_entries(data):
+        if model_data.get("usage_timestamps"):
+            _prune_usage(*_usage_lists(model_data), cutoff)
+    # The flush writes the pruned snapshot and empties the log
+    _save_quota_data_unlocked(data)
+    _usage_appends = 0
 
 
 def get_quota_summary():
     """
     Returns a text summary of usage quotas.
     """
+    # Without stored OpenRouter limits the credit info is fetched in the
+    # background while the other sections are built
+    or_future = None
+    if OPENROUTER_API_KEY and not get_quota_data().get("openrouter_limits"):
+        or_future = _io_executor.submit(get_openrouter_quota_info)
+
     with lock:
-        data = get_quota_data()
+        data = _get_quota_data_unlocked()
         summary = "<b>📊 API Quota Summary</b>\n\n"
-        now = datetime.now(timezone.utc)
+        now = time.time()
+        minute_ago = now - MINUTE_WINDOW
+        day_ago = now - DAY_WINDOW
 
         # Gemini
         if "gemini" in data:
@@ -361,22 +814,8 @@ def get_quota_summary():
                 rpd_limit = details.get("requests_per_day", 0)
                 timestamps = details.get("usage_timestamps", [])
 
-                # Filter last minute for RPM
-                recent_requests = [
-                    r
-                    for r in timestamps
-                    if now - datetime.fromisoformat(r["timestamp"])
-                    <= timedelta(minutes=1)
-                ]
-                rpm_usage = len(recent_requests)
-
-                # Filter last 24 hours for RPD
-                daily_requests = [
-                    r
-                    for r in timestamps
-                    if now - datetime.fromisoformat(r["timestamp"]) <= timedelta(days=1)
-                ]
-                rpd_usage = len(daily_requests)
+                # Requests in the last minute (RPM) and 24 hours (RPD)
+                rpm_usage, rpd_usage = _window_counts(timestamps, minute_ago, day_ago)
 
                 summary += f"• <code>{model}</code>\n"
                 summary += f"  ├ {rpm_usage}/{rpm_limit} RPM\n"
@@ -404,12 +843,7 @@ def get_quota_summary():
                 timestamps = details.get("usage_timestamps", [])
 
                 # Calculate daily usage from timestamps
-                daily_requests = [
-                    r
-                    for r in timestamps
-                    if now - datetime.fromisoformat(r["timestamp"]) <= timedelta(days=1)
-                ]
-                rpd_usage = len(daily_requests)
+                rpd_usage = _count_since(timestamps, day_ago)
 
                 summary += f"• <code>{model}</code>\n"
                 summary += f"  ├ Requests: {rpm_remaining}/{rpm_limit} RPM\n"
@@ -423,8 +857,8 @@ def get_quota_summary():
             summary += "<b>🔹 OpenRouter</b>\n"
             # First check stored limits, then fetch if not available
             or_info = data.get("openrouter_limits", {})
-            if not or_info:
-                or_info = get_openrouter_quota_info()
+            if not or_info and or_future is not None:
+                or_info = or_future.result()
             if or_info:
                 limit = or_info.get("limit")
                 limit_remaining = or_info.get("limit_remaining")
@@ -444,14 +878,9 @@ def get_quota_summary():
 
                 # Count daily requests from stored usage for free models
                 daily_req_count = 0
-                for model_name, model_data in data.get("openrouter", {}).items():
+                for model_data in data["openrouter"].get("usage", {}).values():
                     timestamps = model_data.get("usage_timestamps", [])
-                    daily_req_count += sum(
-                        1
-                        for r in timestamps
-                        if now - datetime.fromisoformat(r["timestamp"])
-                        <= timedelta(days=1)
-                    )
+                    daily_req_count += _count_since(timestamps, day_ago)
 
                 summary += (
                     f"• Free models: {daily_req_count}/{rpd_limit} RPD (20 RPM)\n"
@@ -464,42 +893,108 @@ def get_quota_summary():
         return summary
 
 
-def wait_for_rate_limit(model_name: str, provider: str = "gemini"):
-    """
-    Checks rate limits and waits if necessary.
-    """
-    data = get_quota_data()
+def _rate_limit(model_name: str, provider: str):
+    """Returns the resolved provider and the RPM/TPM limits (0 = none) of a model."""
+    cached = _rate_limits.get((provider, model_name))
+    if cached is not None:
+        return cached
 
-    # Auto-detect provider if default
-    if provider == "gemini" and model_name not in data.get("gemini", {}):
-        if model_name in data.get("groq", {}):
-            provider = "groq"
-        elif model_name in data.get("openrouter", {}):
-            provider = "openrouter"
+    requested_provider = provider
+    # Under the data lock: a concurrent save cannot be followed by a stale entry
+    with lock:
+        data = _get_quota_data_unlocked()
 
-    if provider not in data or model_name not in data[provider]:
-        return
+        provider = _resolve_provider(data, model_name, provider)
+        model_data = _model_data(data, provider, model_name) or {}
+        cached = _rate_limits[(requested_provider, model_name)] = (
+            provider,
+            model_data.get("requests_per_minute", 0),
+            model_data.get("tokens_per_minute", 0),
+        )
+    return cached
 
-    # Check RPM
-    limit = data[provider][model_name].get("requests_per_minute", 0)
-    if limit <= 0:
-        return
 
+def reload_limits():
+    """
+    Drops the cached RPM/TPM limits, e.g. after quota.json was edited by hand.
+
+    Without pending in-memory changes the quota data is re-read from disk on
+    next use as well; otherwise those changes are kept and written back.
+    """
+    global _quota_mtime
     with lock:
-        now = time.time()
-        key = f"{provider}:{model_name}"
+        if not _quota_dirty.is_set():
+            _quota_mtime = None
+        _rate_limits.clear()
 
-        if key not in request_timestamps:
-            request_timestamps[key] = []
 
-        # Clean old timestamps
-        request_timestamps[key] = [t for t in request_timestamps[key] if now - t < 60]
+def _token_slot(window: List[tuple], tokens: int, limit: int, slot: float) -> float:
+    """
+    Earliest time, not before ``slot``, at which ``tokens`` more tokens fit in
+    the TPM ``limit`` given the (time, tokens) reservations in ``window``.
+    """
+    # A request larger than the whole budget waits for an empty window
+    excess = sum(t for _, t in window) + min(tokens, limit) - limit
+    # Reservations may be out of order (some are in the future): few entries
+    for reserved_at, reserved_tokens in sorted(window):
+        if excess <= 0:
+            break
+        # The window frees these tokens one minute after the reservation
+        slot = max(slot, reserved_at + MINUTE_WINDOW + 1)  # +1 buffer
+        excess -= reserved_tokens
+    return slot
+
+
+def wait_for_rate_limit(model_name: str, provider: str = "gemini", tokens: int = 0):
+    """
+    Checks rate limits and waits if necessary.
 
-        if len(request_timestamps[key]) >= limit:
-            time_to_wait = 60 - (now - request_timestamps[key][0]) + 1  # +1 buffer
-            print(
-                f"--- Rate limit reached for {model_name} ({provider}). Waiting {time_to_wait:.2f}s ---"
-            )
-            time.sleep(time_to_wait)
+    ``tokens`` is the estimated size of the request, checked against the
+    model's TPM limit (if any) on top of the RPM limit.
+    """
+    provider, limit, tpm_limit = _rate_limit(model_name, provider)
+    if tpm_limit <= 0 or tokens <= 0:
+        tpm_limit = 0
+    if limit <= 0 and not tpm_limit:
+        return
 
-        request_timestamps[key].append(time.time())
+    key = f"{provider}:{model_name}"
+    with _lock_for(key):
+        now = time.time()
+        cutoff = now - MINUTE_WINDOW
+        slot = now
+
+        if limit > 0:
+            window = request_timestamps.setdefault(key, [])
+
+            # Clean old timestamps: the list is sorted, expired ones are a prefix
+            expired = bisect.bisect_right(window, cutoff)
+            if expired:
+                del window[:expired]
+
+            # The request slot is reserved while holding the lock: with a full
+            # window it is the moment the limit-th most recent request expires.
+            # Entries may be reservations in the future, so later callers queue
+            # up behind them instead of all waking up at the same time.
+            if len(window) >= limit:
+                slot = window[-limit] + MINUTE_WINDOW + 1  # +1 buffer
+
+        if tpm_limit:
+            token_window = token_reservations.setdefault(key, [])
+            token_window[:] = [r for r in token_window if r[0] > cutoff]
+            slot = _token_slot(token_window, tokens, tpm_limit, slot)
+            token_window.append((slot, tokens))
+
+        if limit > 0:
+            # A slot of "now" can precede reservations already in the future:
+            # insert in order so the window stays sorted
+            bisect.insort(window, slot)
+
+    # Sleep outside the lock: other callers of the same model can still
+    # reserve their own slot in the meantime
+    time_to_wait = slot - now
+    if time_to_wait > 0:
+        print(
+            f"--- Rate limit reached for {model_name} ({provider}). Waiting {time_to_wait:.2f}s ---"
+        )
+        time.sleep(time_to_wait)
@@ -5,11 +5,12 @@ Module for generating article summaries using LLMs (Gemini, Groq, OpenRouter).
 import asyncio
 import os
 import re
-import time
-from typing import Optional, List, Set, Dict, Any
-from dotenv import load_dotenv
+from functools import lru_cache
+from itertools import islice
+from typing import Optional, List, Set, Dict, Any, Callable, Tuple
 
 # ---
+from core import llm_cache
 from core.extractor import ArticleContent
 from core.quota_manager import (
     update_model_usage,
@@ -19,17 +20,39 @@ from core.quota_manager import (
 )
 from google import genai
 from google.genai import types
-from openai import OpenAI
-from config import SUMMARY_LANGUAGE, GROQ_API_KEY, OPENROUTER_API_KEY
+from openai import AsyncOpenAI
+# config loads the .env file once, on first import
+from config import (
+    SUMMARY_LANGUAGE,
+    GROQ_API_KEY,
+    OPENROUTER_API_KEY,
+    PROMPTS_FOLDER,
+    LLM_CACHE_TTL_SUMMARY,
+    LLM_CACHE_TTL_QNA,
+    LLM_MAX_CONCURRENCY,
+)
+
+# Keyword/hashtag candidates, compiled once instead of on every call
+_WORD5_RE = re.compile(r"\b\w{5,}\b")
+_WORD4_RE = re.compile(r"\b\w{4,}\b")
+# ASCII bytes that are not letters or digits, deleted from hashtag candidates
+_NON_ALNUM_BYTES = bytes(c for c in range(128) if not chr(c).isalnum())
+# Template placeholders such as {{title}}
+_TMPL_RE = re.compile(r"\{\{(\w+)\}\}")
 
-# Load environment variables from .env
-load_dotenv()
+# In-flight LLM requests per (provider, model), rate-limit wait included: a burst
+# of summaries queues here instead of piling up 429 errors and sleeping threads
+_SEMAPHORES: Dict[tuple, asyncio.Semaphore] = {}
+# Requests being processed, by response-cache key -> Future of their result
+# (None if the task sending the request was cancelled)
+_INFLIGHT: Dict[str, asyncio.Future] = {}
 
 
 def _extract_keywords(text: str) -> List[str]:
     print("\n--- Enrichment: Simulated Keyword Extraction ---")
     base_keywords = ["tecnologia", "innovazione", "sostenibility"]
-    words = re.findall(r"\b\w{5,}\b", text.lower())
+    # Only the first three matches are needed: stop scanning the article there
+    words = [m.group() for m in islice(_WORD5_RE.finditer(text.lower()), 3)]
     if len(words) > 2:
         base_keywords.extend(words[:2])
     return base_keywords
@@ -40,14 +63,18 @@ def generate_hashtags(article: ArticleContent, summary_text: str) -> str:
     if article.tags:
         candidates.update([tag.lower() for tag in article.tags])
     if article.title:
-        title_words = re.findall(r"\b\w{4,}\b", article.title.lower())
+        title_words = _WORD4_RE.findall(article.title.lower())
         candidates.update(title_words)
     keywords = _extract_keywords(article.text)
     candidates.update([kw.lower() for kw in keywords])
 
     hashtags: Set[str] = set()
     for cand in candidates:
-        clean_tag = re.sub(r"[^a-zA-Z0-9]", "", cand)
+        # Same result as re.sub(r"[^a-zA-Z0-9]", "", cand) in one C-level pass:
+        # non-ASCII characters are dropped by the encoding, the rest by translate
+        clean_tag = (
+            cand.encode("ascii", "ignore").translate(None, _NON_ALNUM_BYTES).decode()
+        )
         if clean_tag:
             hashtags.add(f"#{clean_tag}")
 
@@ -70,13 +97,25 @@ def _clean_model_name(model_name: str) -> tuple[str, str]:
     quota_data = get_quota_data()
     if model_name in quota_data.get("groq", {}):
         return model_name, "groq"
-    elif model_name in quota_data.get("openrouter", {}):
+    elif model_name in quota_data.get("openrouter", {}).get("models", ()):
         return model_name, "openrouter"
 
     return model_name, "gemini"  # Default
 
 
-def _call_gemini_api(
+# One client per API key, reused across calls and retries: the connection pool
+# (and its TLS sessions) survives between requests. Both SDKs are safe to share.
+@lru_cache(maxsize=None)
+def _gemini_client(api_key: str) -> genai.Client:
+    return genai.Client(api_key=api_key)
+
+
+@lru_cache(maxsize=None)
+def _openai_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+
+async def _call_gemini_api(
     system_instruction: str,
     user_prompt: str,
     model_name: str,
@@ -86,7 +125,7 @@ def _call_gemini_api(
     top_p: float = 0.95,
     top_k: int = 40,
 ) -> Dict[str, Any]:
-    """Calls Google Gemini API."""
+    """Calls Google Gemini API (async client: no worker thread per request)."""
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         return {"summary": "**ERROR:** GEMINI_API_KEY not set.", "token_count": 0}
@@ -98,7 +137,7 @@ def _call_gemini_api(
             print(
                 f"\n--- Attempt {attempt + 1}/{max_retries} calling Gemini ({model_name})... ---"
             )
-            client = genai.Client(api_key=api_key)
+            client = _gemini_client(api_key)
             contents = [
                 types.Content(
                     role="user", parts=[types.Part.from_text(text=user_prompt)]
@@ -114,7 +153,7 @@ def _call_gemini_api(
             if tools:
                 generate_content_config.tools = tools
 
-            response = client.models.generate_content(
+            response = await client.aio.models.generate_content(
                 model=model_name,
                 contents=contents,
                 config=generate_content_config,
@@ -168,7 +207,7 @@ def _call_gemini_api(
                 if attempt < len(retry_delays):
                     delay = retry_delays[attempt]
                     print(f"--- ERROR 503 (Overloaded). Waiting {delay}s... ---")
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                     continue
                 else:
                     print("--- ERROR 503 Final failure. ---")
@@ -186,7 +225,7 @@ def _call_gemini_api(
     return {"summary": "**ERROR:** Unexpected issue after retries.", "token_count": 0}
 
 
-def _call_openai_compatible_api(
+async def _call_openai_compatible_api(
     system_instruction: str,
     user_prompt: str,
     model_name: str,
@@ -194,7 +233,7 @@ def _call_openai_compatible_api(
     max_retries: int = 4,
     temperature: float = 0.6,
 ) -> Dict[str, Any]:
-    """Calls OpenAI-compatible APIs (Groq, OpenRouter)."""
+    """Calls OpenAI-compatible APIs (Groq, OpenRouter) with the async client."""
     from core.quota_manager import (
         update_groq_rate_limits,
         update_openrouter_limits,
@@ -223,7 +262,7 @@ def _call_openai_compatible_api(
             print(
                 f"\n--- Attempt {attempt + 1}/{max_retries} calling {provider} ({model_name})... ---"
             )
-            client = OpenAI(api_key=api_key, base_url=base_url)
+            client = _openai_client(api_key, base_url)
 
             messages = [
                 {"role": "system", "content": system_instruction},
@@ -240,24 +279,27 @@ def _call_openai_compatible_api(
 
             # Use with_raw_response for Groq to capture rate limit headers
             if provider == "groq":
-                raw_response = client.chat.completions.with_raw_response.create(
+                raw_response = await client.chat.completions.with_raw_response.create(
                     model=model_name,
                     messages=messages,
                     temperature=temperature,
                 )
-                # Extract and save rate limit headers
-                update_groq_rate_limits(model_name, dict(raw_response.headers))
+                # Extract and save rate limit headers (in a thread: the quota lock
+                # may be held by a flush to disk)
+                await asyncio.to_thread(
+                    update_groq_rate_limits, model_name, dict(raw_response.headers)
+                )
                 response = raw_response.parse()
             else:
-                response = client.chat.completions.create(
+                response = await client.chat.completions.create(
                     model=model_name,
                     messages=messages,
                     temperature=temperature,
                     extra_headers=extra_headers if extra_headers else None,
                 )
-                # Update OpenRouter limits after successful call
+                # Update OpenRouter limits after successful call (blocking HTTP request)
                 if provider == "openrouter":
-                    update_openrouter_limits()
+                    await asyncio.to_thread(update_openrouter_limits)
 
             summary_text = response.choices[0].message.content
             token_count = response.usage.total_tokens if response.usage else 0
@@ -281,7 +323,7 @@ def _call_openai_compatible_api(
                 if attempt < len(retry_delays):
                     delay = retry_delays[attempt]
                     print(f"--- Error {e}. Waiting {delay}s... ---")
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                     continue
 
             if "429" in str(e):
@@ -294,7 +336,7 @@ def _call_openai_compatible_api(
     return {"summary": "**ERROR:** Unexpected issue after retries.", "token_count": 0}
 
 
-def _call_llm_api(
+async def _call_llm_api(
     system_instruction: str,
     user_prompt: str,
     model_name: str,
@@ -311,7 +353,7 @@ def _call_llm_api(
     model_name, provider = _clean_model_name(model_name)
 
     if provider == "gemini":
-        return _call_gemini_api(
+        return await _call_gemini_api(
             system_instruction,
             user_prompt,
             model_name,
@@ -323,7 +365,7 @@ def _call_llm_api(
         )
     else:
         # Groq/OpenRouter don't support Google Search tools in this implementation yet
-        return _call_openai_compatible_api(
+        return await _call_openai_compatible_api(
             system_instruction,
             user_prompt,
             model_name,
@@ -333,73 +375,272 @@ def _call_llm_api(
         )
 
 
-async def summarize_article(
-    article: ArticleContent,
-    summary_type: str,
-    prompts_dir: str = os.path.join("src", "prompts"),
-    use_web_search: bool = False,
-    use_url_context: bool = False,
-    model_name: str = "gemini-2.5-flash",
-) -> Optional[Dict[str, Any]]:
+def _render(template: str, values: Dict[str, str]) -> str:
     """
-    Orchestrates summary generation.
+    Fills the {{placeholders}} of a prompt template in a single pass (one copy
+    of the article text instead of one per placeholder). Unknown placeholders
+    are left as they are, and placeholders inside the values are not expanded.
+    """
+    return _TMPL_RE.sub(lambda m: values.get(m.group(1), m.group(0)), template)
+
+
+def _supports_url_context(model_name: str) -> bool:
+    """True for the Gemini models that accept the URL context tool (not Gemma)."""
+    clean_model, provider = _clean_model_name(model_name)
+    return (
+        provider == "gemini"
+        and clean_model.startswith("gemini-")
+        and not clean_model.startswith("gemini-1.")
+    )
+
+
+def _split_summary_prompt(template: str) -> Tuple[str, str]:
+    """Splits a summary prompt into (system_instruction, user_template)."""
+    if "**Contesto dell'articolo:**" in template:
+        parts = template.split("**Contesto dell'articolo:**", 1)
+        return (parts[0] or "").strip(), "**Contesto dell'articolo:**" + parts[1]
+    return template, "**Contesto dell'articolo:**\n{{title}}\n{{text}}"
+
+
+def _split_qna_prompt(template: str) -> Tuple[str, str]:
+    """Splits the QnA prompt into (system_instruction, user_template)."""
+    if "---" in template:
+        parts = template.split("---", 1)
+        return (parts[0] or "").strip(), (parts[1] or "").strip()
+    return "You are a helpful assistant.", template
+
+
+@lru_cache(maxsize=32)
+def _parse_prompt(
+    prompt_path: str, mtime_ns: int, split: Callable[[str], Tuple[str, str]]
+) -> Tuple[str, str]:
+    """Reads and splits a prompt file; cached until the file changes (mtime)."""
+    with open(prompt_path, "r", encoding="utf-8") as f:
+        template = f.read()
+    return split(template.replace("{{summary_language}}", SUMMARY_LANGUAGE))
+
+
+def _load_prompt(
+    prompt_path: str, split: Callable[[str], Tuple[str, str]]
+) -> Optional[Tuple[str, str]]:
     """
-    prompt_path = os.path.join(prompts_dir, f"{summary_type}.md")
-    if not os.path.exists(prompt_path):
+    Returns the (system_instruction, user_template) of a prompt file, or None.
+
+    A single stat per call: the file is read and parsed again only when edited.
+    """
+    try:
+        mtime_ns = os.stat(prompt_path).st_mtime_ns
+    except FileNotFoundError:
         print(f"Error: Prompt file not found: {prompt_path}")
         return None
-
     try:
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            template = f.read()
+        return _parse_prompt(prompt_path, mtime_ns, split)
     except IOError as e:
         print(f"Error reading prompt file: {e}")
         return None
 
-    template = template.replace("{{summary_language}}", SUMMARY_LANGUAGE)
 
-    if "**Contesto dell'articolo:**" in template:
-        parts = template.split("**Contesto dell'articolo:**", 1)
-        system_instruction = (parts[0] or "").strip()
-        user_template = "**Contesto dell'articolo:**" + parts[1]
+async def _generate(
+    system_instruction: str,
+    user_prompt: str,
+    model_name: str,
+    tools: Optional[List[types.Tool]] = None,
+    cache_ttl: float = 0,
+    cache_parts: Optional[tuple] = None,
+    temperature: float = 0.6,
+    top_p: float = 0.95,
+    top_k: int = 40,
+) -> Dict[str, Any]:
+    """
+    Rate limit, LLM call and usage accounting, with the persistent response cache.
+
+    A cache hit skips the provider entirely: no rate-limit wait, no network
+    round-trip and no usage recorded. Calls with tools (web search) depend on
+    live data and are never cached; ``cache_ttl <= 0`` bypasses the cache.
+    ``cache_parts`` replace ``user_prompt`` in the cache key, so that requests
+    worded differently but with the same meaning share an entry. Concurrent
+    cacheable requests with the same key are sent to the provider only once.
+    """
+    clean_model, provider = _clean_model_name(model_name)
+    cache_key = None
+    if cache_ttl > 0 and not tools:
+        cache_key = llm_cache.make_key(
+            provider,
+            clean_model,
+            temperature,
+            top_p,
+            top_k,
+            system_instruction,
+            *((user_prompt,) if cache_parts is None else cache_parts),
+        )
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached is not None:
+            print(f"--- LLM cache hit ({provider}: {clean_model}) ---")
+            return cached
+
+    request = dict(
+        system_instruction=system_instruction,
+        user_prompt=user_prompt,
+        model_name=model_name,
+        clean_model=clean_model,
+        provider=provider,
+        tools=tools,
+        temperature=temperature,
+        top_p=top_p,
+        top_k=top_k,
+    )
+    if cache_key is None:
+        return await _dispatch(**request)
+
+    # An identical request is already running: share its result instead of
+    # paying for a second call (shield: a cancelled waiter leaves it running)
+    inflight = _INFLIGHT.get(cache_key)
+    while inflight is not None:
+        print(f"--- Joining in-flight request ({provider}: {clean_model}) ---")
+        llm_response = await asyncio.shield(inflight)
+        if llm_response is not None:
+            return llm_response
+        # None: the leading task was cancelled. Join the next leader, if another
+        # waiter took over, or send the request ourselves
+        inflight = _INFLIGHT.get(cache_key)
+
+    future = asyncio.get_running_loop().create_future()
+    # Marks a failure as retrieved even if no other caller was waiting for it
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _INFLIGHT[cache_key] = future
+    try:
+        llm_response = await _dispatch(
+            **request, cache_key=cache_key, cache_ttl=cache_ttl
+        )
+    except asyncio.CancelledError:
+        # Only this task was cancelled: the waiters must not be, they retry
+        future.set_result(None)
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        raise
     else:
-        system_instruction = template
-        user_template = "**Contesto dell'articolo:**\n{{title}}\n{{text}}"
-
-    user_prompt = user_template.replace("{{title}}", article.title or "N/A")
-    user_prompt = user_prompt.replace("{{author}}", article.author or "N/A")
-    user_prompt = user_prompt.replace("{{sitename}}", article.sitename or "N/A")
-    user_prompt = user_prompt.replace("{{date}}", article.date or "N/A")
-    user_prompt = user_prompt.replace(
-        "{{tags}}", ", ".join(article.tags) if article.tags else "N/A"
+        future.set_result(llm_response)
+        return llm_response
+    finally:
+        # Removed before the waiters resume (Future callbacks run later)
+        del _INFLIGHT[cache_key]
+
+
+async def _dispatch(
+    system_instruction: str,
+    user_prompt: str,
+    model_name: str,
+    clean_model: str,
+    provider: str,
+    tools: Optional[List[types.Tool]],
+    temperature: float,
+    top_p: float,
+    top_k: int,
+    cache_key: Optional[str] = None,
+    cache_ttl: float = 0,
+) -> Dict[str, Any]:
+    """Throttled LLM call, then usage accounting and storage in the cache."""
+    semaphore = _SEMAPHORES.get((provider, clean_model))
+    if semaphore is None:
+        semaphore = _SEMAPHORES[(provider, clean_model)] = asyncio.Semaphore(
+            LLM_MAX_CONCURRENCY
+        )
+    # Rough prompt size (~4 characters per token) for the TPM check
+    estimated_tokens = (len(system_instruction) + len(user_prompt)) // 4
+
+    async with semaphore:
+        await asyncio.to_thread(
+            wait_for_rate_limit, clean_model, provider, estimated_tokens
+        )
+        llm_response = await _call_llm_api(
+            system_instruction=system_instruction,
+            user_prompt=user_prompt,
+            model_name=model_name,  # Original with prefix, cleaned again
+            tools=tools,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+        )
+
+    response_text = llm_response.get("summary", "")
+    if "ERRORE:" not in response_text and "ERROR:" not in response_text:
+        await asyncio.to_thread(
+            update_model_usage,
+            clean_model,
+            llm_response.get("token_count", 0),
+            provider,
+        )
+        # Overload messages are not errors for the quota, but must not be cached
+        if cache_key is not None and not llm_response.get("needs_retry"):
+            await asyncio.to_thread(llm_cache.put, cache_key, llm_response, cache_ttl)
+
+    return llm_response
+
+
+async def summarize_article(
+    article: ArticleContent,
+    summary_type: str,
+    prompts_dir: str = PROMPTS_FOLDER,
+    use_web_search: bool = False,
+    use_url_context: bool = False,
+    model_name: str = "gemini-2.5-flash",
+    use_cache: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """
+    Orchestrates summary generation.
+
+    With ``use_cache=False`` the response cache is bypassed (e.g. when the user
+    explicitly asks for a new generation).
+    """
+    prompt = _load_prompt(
+        os.path.join(prompts_dir, f"{summary_type}.md"), _split_summary_prompt
     )
-    user_prompt = user_prompt.replace("{{url}}", article.url or "N/A")
-    user_prompt = user_prompt.replace("{{text}}", article.text or "N/A")
+    if prompt is None:
+        return None
+    system_instruction, user_template = prompt
 
     tools = []
     if use_web_search:
         tools.append(types.Tool(googleSearch=types.GoogleSearch()))
+
+    text = article.text or "N/A"
+    if (
+        use_url_context
+        and article.url
+        and article.plain_fetch
+        and _supports_url_context(model_name)
+    ):
+        # The page was served to a plain request: Gemini reads it itself with
+        # the URL context tool and the article text (often tens of KB) is not
+        # sent. Pages that needed curl_cffi/FlareSolverr/BeautifulSoup keep the
+        # inline text, since Google's fetcher would likely be blocked as well
+        tools.append(types.Tool(url_context=types.UrlContext()))
+        text = f"Contenuto disponibile all'URL {article.url}"
+
+    user_prompt = _render(
+        user_template,
+        {
+            "title": article.title or "N/A",
+            "author": article.author or "N/A",
+            "sitename": article.sitename or "N/A",
+            "date": article.date or "N/A",
+            "tags": ", ".join(article.tags) if article.tags else "N/A",
+            "url": article.url or "N/A",
+            "text": text,
+        },
+    )
     if use_url_context and article.url:
         user_prompt = f"Basandoti sul contenuto dell'URL {article.url}, {user_prompt}"
 
-    # We need to clean model name here for rate limiting check too
-    clean_model, provider = _clean_model_name(model_name)
-    await asyncio.to_thread(wait_for_rate_limit, clean_model, provider)
-
-    llm_response = await asyncio.to_thread(
-        _call_llm_api,
-        system_instruction=system_instruction,
-        user_prompt=user_prompt,
-        model_name=model_name,  # Pass original with prefix, _call_llm_api cleans it again
+    llm_response = await _generate(
+        system_instruction,
+        user_prompt,
+        model_name,
         tools=tools or None,
+        cache_ttl=LLM_CACHE_TTL_SUMMARY if use_cache else 0,
     )
-
     summary_text = llm_response["summary"]
-    token_count = llm_response["token_count"]
-    # provider is returned by llm_response, but we already know it
-
-    if "ERRORE:" not in summary_text and "ERROR:" not in summary_text:
-        await asyncio.to_thread(update_model_usage, clean_model, token_count, provider)
 
     return {
         "summary": summary_text,
@@ -407,61 +648,72 @@ async def summarize_article(
     }
 
 
+async def summarize_articles_batch(
+    articles: List[ArticleContent],
+    summary_type: str,
+    **kwargs: Any,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Summarizes several articles concurrently.
+
+    The requests run together on the event loop; the per-model concurrency cap
+    and rate limits of ``_generate`` still apply. Results are in the order of
+    ``articles``; a failed article yields None. ``kwargs`` are passed to
+    ``summarize_article``.
+    """
+    results = await asyncio.gather(
+        *(summarize_article(article, summary_type, **kwargs) for article in articles),
+        return_exceptions=True,
+    )
+    for i, result in enumerate(results):
+        if isinstance(result, BaseException):
+            print(f"Error summarizing {articles[i].url}: {result}")
+            results[i] = None
+    return results
+
+
+def _normalize_question(question: str) -> str:
+    """
+    Normalizes a question for the QnA cache: only case, spacing and trailing
+    "?", "!" or "." are ignored. Other symbols can change the meaning
+    ("C++" vs "C#", "3.5%"), so they are kept.
+    """
+    return " ".join(question.casefold().split()).rstrip("?!. ")
+
+
 async def answer_question(
     article: ArticleContent,
     question: str,
     summary: str,
     model_name: str = "gemini-1.5-flash",
-    prompts_dir: str = os.path.join("src", "prompts"),
+    prompts_dir: str = PROMPTS_FOLDER,
 ) -> Optional[Dict[str, Any]]:
     """
     Asynchronously answers a user's question based on the article content.
     """
-    prompt_path = os.path.join(prompts_dir, "qna.md")
-    if not os.path.exists(prompt_path):
-        print(f"Error: Prompt file not found: {prompt_path}")
-        return None
-
-    try:
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            template = f.read()
-    except IOError as e:
-        print(f"Error reading prompt file: {e}")
+    prompt = _load_prompt(os.path.join(prompts_dir, "qna.md"), _split_qna_prompt)
+    if prompt is None:
         return None
+    system_instruction, user_template = prompt
 
-    template = template.replace("{{summary_language}}", SUMMARY_LANGUAGE)
-
-    if "---" in template:
-        parts = template.split("---", 1)
-        system_instruction = (parts[0] or "").strip()
-        user_template = (parts[1] or "").strip()
-    else:
-        system_instruction = "You are a helpful assistant."
-        user_template = template
-
-    user_prompt = user_template.replace("{{title}}", article.title or "N/A")
-    user_prompt = user_prompt.replace("{{url}}", article.url or "N/A")
-    user_prompt = user_prompt.replace("{{summary}}", summary or "N/A")
-    user_prompt = user_prompt.replace("{{text}}", article.text or "N/A")
-    user_prompt = user_prompt.replace("{{question}}", question)
-
-    tools = []
-
-    clean_model, provider = _clean_model_name(model_name)
-    await asyncio.to_thread(wait_for_rate_limit, clean_model, provider)
-
-    llm_response = await asyncio.to_thread(
-        _call_llm_api,
-        system_instruction=system_instruction,
-        user_prompt=user_prompt,
-        model_name=model_name,
-        tools=tools or None,
+    values = {
+        "title": article.title or "N/A",
+        "url": article.url or "N/A",
+        "summary": summary or "N/A",
+        "text": article.text or "N/A",
+    }
+    # Cache key: same article and prompt, question compared in normalized form
+    cache_parts = (user_template, *values.values(), _normalize_question(question))
+    values["question"] = question
+    user_prompt = _render(user_template, values)
+
+    llm_response = await _generate(
+        system_instruction,
+        user_prompt,
+        model_name,
+        cache_ttl=LLM_CACHE_TTL_QNA,
+        cache_parts=cache_parts,
     )
-
     answer_text = llm_response.get("summary", "")
-    token_count = llm_response.get("token_count", 0)
-
-    if "ERRORE:" not in answer_text and "ERROR:" not in answer_text:
-        await asyncio.to_thread(update_model_usage, clean_model, token_count, provider)
 
     return {"summary": answer_text}
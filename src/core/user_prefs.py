@@ -0,0 +1,47 @@
+"""
+Per-user preferences stored in ``context.user_data``.
+"""
+
+from typing import Optional
+
+# Key under which the preferences object is stored in context.user_data
+PREFS_KEY = "prefs"
+
+
+class UserPrefs:
+    """
+    User settings read on every message (web search, URL context, prompt, models).
+
+    A ``__slots__`` class: attribute access avoids the repeated
+    ``user_data.get(key, default)`` lookups. ``None`` models mean
+    "use the default model".
+    """
+
+    __slots__ = (
+        "web_search",
+        "url_context",
+        "prompt",
+        "short_summary_model",
+        "telegraph_summary_model",
+    )
+
+    def __init__(self):
+        self.web_search: bool = False
+        self.url_context: bool = False
+        self.prompt: str = "technical_summary"
+        self.short_summary_model: Optional[str] = None
+        self.telegraph_summary_model: Optional[str] = None
+
+
+def get_prefs(context) -> UserPrefs:
+    """Returns the user's preferences, creating them on first access."""
+    prefs = context.user_data.get(PREFS_KEY)
+    if prefs is None:
+        prefs = context.user_data[PREFS_KEY] = UserPrefs()
+    return prefs
+
+
+def reset_prefs(context) -> UserPrefs:
+    """Replaces the user's preferences with fresh defaults."""
+    prefs = context.user_data[PREFS_KEY] = UserPrefs()
+    return prefs
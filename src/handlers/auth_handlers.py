@@ -7,6 +7,7 @@ from telegram.ext import ContextTypes
 from config import BOT_PASSWORD, AUTH
 from keyboards import get_main_keyboard
 from core.user_manager import add_authorized_user, is_user_authorized
+from core.user_prefs import reset_prefs
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -22,8 +23,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return AUTH
 
-    context.user_data["web_search"] = False
-    context.user_data["url_context"] = False
+    reset_prefs(context)
     reply_markup = get_main_keyboard()
     await update.message.reply_text(
         "👋 <b>Welcome to the summarizer bot!</b> Send me a link to get started.",
@@ -42,8 +42,7 @@ async def check_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if password == BOT_PASSWORD:
         add_authorized_user(user_id)
         print(f"User {user_id} authorized successfully.")
-        context.user_data["web_search"] = False
-        context.user_data["url_context"] = False
+        reset_prefs(context)
         reply_markup = get_main_keyboard()
         await update.message.reply_text(
             "<b>Access granted!</b> ✅ You can now use the bot. Send me a link to get started.",
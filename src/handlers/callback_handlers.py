@@ -10,11 +10,18 @@ from telegram.ext import ContextTypes
 
 from core.summarizer import summarize_article
 from core.scraper import crea_articolo_telegraph_with_content
-from core.history_manager import load_history, save_history
+from core.history_manager import update_hashtags
 from keyboards import get_retry_keyboard
 from utils import parse_hashtags
-from config import load_available_models, LINKWARDEN_URL, LINKWARDEN_API_KEY
+from config import get_default_model, LINKWARDEN_URL, LINKWARDEN_API_KEY
 from handlers.message_handlers import animate_loading_message
+from core.user_prefs import get_prefs
+
+# The "📖 Original Article" link and the model footer of a summary message
+_ORIGINAL_LINK_RE = re.compile(
+    r'(<a href="[^"]+">📖\s*Original Article</a>)', re.IGNORECASE
+)
+_FOOTER_RE = re.compile(r"(<i>\s*Summary generated with[^<]*</i>)", re.IGNORECASE)
 
 
 async def generate_telegraph_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -53,15 +60,13 @@ async def generate_telegraph_page(update: Update, context: ContextTypes.DEFAULT_
         if not article_content or not one_paragraph_summary:
             raise ValueError("Incomplete summary data.")
 
-        default_model = (
-            load_available_models()[0]
-            if load_available_models()
-            else "gemini-1.5-flash"
+        prefs = get_prefs(context)
+        model_name = prefs.telegraph_summary_model or get_default_model(
+            "gemini-1.5-flash"
         )
-        model_name = context.user_data.get("telegraph_summary_model", default_model)
-        use_web_search = context.user_data.get("web_search", False)
-        use_url_context = context.user_data.get("url_context", False)
-        technical_summary_prompt = context.user_data.get("prompt", "technical_summary")
+        use_web_search = prefs.web_search
+        use_url_context = prefs.url_context
+        technical_summary_prompt = prefs.prompt
 
         technical_summary_data = await summarize_article(
             article_content,
@@ -121,17 +126,14 @@ async def generate_telegraph_page(update: Update, context: ContextTypes.DEFAULT_
 
         # Find the "Original Article" link and insert the Telegraph link before it
         # The regex looks for the specific "📖 Original Article" link
-        pattern = re.compile(r'(<a href="[^"]+">📖\s*Original Article</a>)', re.IGNORECASE)
-
         # Replace the found pattern with the new link followed by the original link
-        updated_text, num_replacements = pattern.subn(
+        updated_text, num_replacements = _ORIGINAL_LINK_RE.subn(
             f"{telegraph_link}\\1", original_message_text
         )
 
         # If the pattern wasn't found, fall back to appending before the footer
         if num_replacements == 0:
-            footer_pattern = re.compile(r'(<i>\s*Summary generated with[^<]*</i>)', re.IGNORECASE)
-            match = footer_pattern.search(original_message_text)
+            match = _FOOTER_RE.search(original_message_text)
             if match:
                 footer_html = match.group(1)
                 main_content = original_message_text.split(footer_html)[0].strip()
@@ -229,13 +231,10 @@ async def retry_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     article_content = article_data["article_content"]
-    use_web_search = context.user_data.get("web_search", False)
-    use_url_context = context.user_data.get("url_context", False)
-
-    default_model = (
-        load_available_models()[0] if load_available_models() else "gemini-1.5-flash"
-    )
-    model_name = context.user_data.get("short_summary_model", default_model)
+    prefs = get_prefs(context)
+    use_web_search = prefs.web_search
+    use_url_context = prefs.url_context
+    model_name = prefs.short_summary_model or get_default_model("gemini-1.5-flash")
 
     hashtag_data = await summarize_article(
         article_content,
@@ -243,6 +242,8 @@ async def retry_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         model_name=model_name,
         use_web_search=use_web_search,
         use_url_context=use_url_context,
+        # The user asked for different hashtags: a cached answer would repeat them
+        use_cache=False,
     )
 
     if not hashtag_data:
@@ -268,13 +269,12 @@ async def retry_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
     new_hashtags_str = hashtag_data.get("summary")
     if new_hashtags_str and new_hashtags_str.startswith("#"):
         new_hashtags = parse_hashtags(new_hashtags_str)
-        user_id = update.effective_user.id
-        history = load_history(user_id)
-        for entry in history:
-            if entry.get("url") == article_content.url:
-                entry["hashtags"] = new_hashtags
-                break
-        save_history(user_id, history)
+        await asyncio.to_thread(
+            update_hashtags,
+            update.effective_user.id,
+            article_content.url,
+            new_hashtags,
+        )
 
         original_message_text = query.message.text_markdown_v2
         escaped_hashtags = " ".join([tag.replace("#", r"\\#") for tag in new_hashtags])
@@ -384,3 +384,20 @@ async def save_to_linkwarden(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await context.bot.answer_callback_query(
             query.id, text=f"❌ Error: {str(e)}", show_alert=True
         )
+
+
+# Dispatch table: prefix of the callback data (before the first ":") -> handler
+CALLBACK_ROUTES = {
+    "create_telegraph_page": generate_telegraph_page,
+    "retry_hashtags": retry_hashtags,
+    "save_to_linkwarden": save_to_linkwarden,
+    "retry": retry_summary,
+}
+
+
+async def route_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Dispatches a callback query to its handler with a single dict lookup."""
+    data = update.callback_query.data or ""
+    handler = CALLBACK_ROUTES.get(data.split(":", 1)[0])
+    if handler:
+        await handler(update, context)
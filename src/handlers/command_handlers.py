@@ -6,6 +6,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from decorators import authorized
 from core.quota_manager import get_quota_summary
+from core.user_prefs import get_prefs
 
 
 @authorized
@@ -21,8 +22,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @authorized
 async def toggle_web_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggles web search on or off."""
-    context.user_data["web_search"] = not context.user_data.get("web_search", False)
-    status = "enabled" if context.user_data["web_search"] else "disabled"
+    prefs = get_prefs(context)
+    prefs.web_search = not prefs.web_search
+    status = "enabled" if prefs.web_search else "disabled"
     await update.message.reply_text(
         f"🌐 Web search <b>{status}</b>.", parse_mode="HTML"
     )
@@ -31,8 +33,9 @@ async def toggle_web_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @authorized
 async def toggle_url_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggles URL context on or off."""
-    context.user_data["url_context"] = not context.user_data.get("url_context", False)
-    status = "enabled" if context.user_data["url_context"] else "disabled"
+    prefs = get_prefs(context)
+    prefs.url_context = not prefs.url_context
+    status = "enabled" if prefs.url_context else "disabled"
     await update.message.reply_text(
         f"🔗 URL context <b>{status}</b>.", parse_mode="HTML"
     )
@@ -45,3 +48,19 @@ async def api_quota(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         f"{summary}", parse_mode="HTML"
     )
+
+
+# Main keyboard buttons handled directly (the prompt/model buttons are
+# conversation entry points and keep their own handlers)
+MENU_ACTIONS = {
+    "📊 API Quota": api_quota,
+    "🌐 Web Search On/Off": toggle_web_search,
+    "🔗 URL Context On/Off": toggle_url_context,
+}
+
+
+async def route_menu_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Dispatches a main keyboard button press by its exact text."""
+    action = MENU_ACTIONS.get(update.message.text)
+    if action:
+        return await action(update, context)
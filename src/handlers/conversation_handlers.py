@@ -5,6 +5,7 @@ Conversation handlers for the Telegram bot.
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from decorators import authorized
+from core.user_prefs import get_prefs
 from keyboards import (
     get_main_keyboard,
     get_prompt_keyboard,
@@ -54,7 +55,7 @@ async def model_selection_submenu(update: Update, context: ContextTypes.DEFAULT_
 async def short_summary_model_chosen(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Stores the chosen model for the short summary."""
     model = update.message.text
-    context.user_data["short_summary_model"] = model
+    get_prefs(context).short_summary_model = model
     reply_markup = get_model_selection_submenu_keyboard(context)
     await update.message.reply_text(
         f"👍 Short summary model set to: <b>{model}</b>",
@@ -70,7 +71,7 @@ async def telegraph_summary_model_chosen(
 ):
     """Stores the chosen model for the Telegraph page."""
     model = update.message.text
-    context.user_data["telegraph_summary_model"] = model
+    get_prefs(context).telegraph_summary_model = model
     reply_markup = get_model_selection_submenu_keyboard(context)
     await update.message.reply_text(
         f"👍 Telegraph page model set to: <b>{model}</b>",
@@ -96,7 +97,7 @@ async def choose_prompt_start(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def prompt_chosen(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Stores the chosen prompt."""
     prompt = update.message.text
-    context.user_data["prompt"] = prompt
+    get_prefs(context).prompt = prompt
     reply_markup = get_main_keyboard()
     await update.message.reply_text(
         f"👍 Prompt set to: <b>{prompt}</b>",
@@ -19,11 +19,17 @@ from keyboards import get_retry_keyboard
 from utils import format_summary_text, parse_hashtags
 from config import (
     TITLE_EMOJIS,
-    load_available_models,
+    get_default_model,
     LINKWARDEN_URL,
     LINKWARDEN_API_KEY,
 )
 from core.quota_manager import QuotaExceededError
+from core.user_prefs import get_prefs
+
+# Compiled once: used on every incoming text message
+_URL_RE = re.compile(r"https?://[^\s<>\"'\[\]]+")
+# Leading line of hashtags the LLM puts before the summary
+_LEADING_HASHTAGS_RE = re.compile(r"^(#\S+(?:\s+#\S+)*)\s*")
 
 
 async def animate_loading_message(
@@ -148,12 +154,9 @@ async def process_url(
                 "article_content": article_content
             }
 
-            default_model = (
-                load_available_models()[0]
-                if load_available_models()
-                else "gemini-2.5-flash"
+            model_name = get_prefs(context).short_summary_model or get_default_model(
+                "gemini-2.5-flash"
             )
-            model_name = context.user_data.get("short_summary_model", default_model)
 
             summary_data = await summarize_article(
                 article_content,
@@ -200,7 +203,7 @@ async def process_url(
             # --- Success Case ---
             llm_hashtags = []
             summary_text_clean = summary_text
-            hashtag_match = re.match(r"^(#\S+(?:\s+#\S+)*)\s*", summary_text)
+            hashtag_match = _LEADING_HASHTAGS_RE.match(summary_text)
             if hashtag_match:
                 hashtag_line = hashtag_match.group(1)
                 llm_hashtags = parse_hashtags(hashtag_line)
@@ -217,81 +220,92 @@ async def process_url(
             ] = summary_text_clean
             context.user_data["articles"][article_id]["hashtags"] = final_hashtags
 
-            add_to_history(chat_id, url, summary_text_clean, final_hashtags)
-
-            no_hashtags_found = not final_hashtags
-            formatted_summary = format_summary_text(summary_text_clean)
-            article_title = article_content.title or "Article"
-            random_emoji = random.choice(TITLE_EMOJIS)
-
-            message_sections = [f"**{random_emoji} {article_title}**"]
-            if no_hashtags_found:
-                message_sections.append(">No Hashtag")
-            else:
-                message_sections.append(">" + " ".join(final_hashtags))
-            message_sections.append(formatted_summary)
-            message_sections.append(f"[📖 Original Article]({url})")
-            message_sections.append(f"_Summary generated with {model_name}_")
-
-            message_markdown = "\n\n".join(filter(None, message_sections))
-            telegram_message = telegramify_markdown.markdownify(
-                message_markdown
-            )
-
-            keyboard_buttons = [
-                InlineKeyboardButton(
-                    "📄 Create Telegraph Page",
-                    callback_data=f"create_telegraph_page:{article_id}",
+            # Saving the history (disk I/O) runs in a worker thread and overlaps
+            # with formatting and sending the message
+            history_task = asyncio.create_task(
+                asyncio.to_thread(
+                    add_to_history, chat_id, url, summary_text_clean, final_hashtags
                 )
-            ]
-            if no_hashtags_found:
-                keyboard_buttons.append(
+            )
+            try:
+                no_hashtags_found = not final_hashtags
+                formatted_summary = format_summary_text(summary_text_clean)
+                article_title = article_content.title or "Article"
+                random_emoji = random.choice(TITLE_EMOJIS)
+
+                message_sections = [f"**{random_emoji} {article_title}**"]
+                if no_hashtags_found:
+                    message_sections.append(">No Hashtag")
+                else:
+                    message_sections.append(">" + " ".join(final_hashtags))
+                message_sections.append(formatted_summary)
+                message_sections.append(f"[📖 Original Article]({url})")
+                message_sections.append(f"_Summary generated with {model_name}_")
+
+                message_markdown = "\n\n".join(filter(None, message_sections))
+                telegram_message = telegramify_markdown.markdownify(message_markdown)
+
+                keyboard_buttons = [
                     InlineKeyboardButton(
-                        "🔄 Retry Hashtags",
-                        callback_data=f"retry_hashtags:{article_id}",
+                        "📄 Create Telegraph Page",
+                        callback_data=f"create_telegraph_page:{article_id}",
+                    )
+                ]
+                if no_hashtags_found:
+                    keyboard_buttons.append(
+                        InlineKeyboardButton(
+                            "🔄 Retry Hashtags",
+                            callback_data=f"retry_hashtags:{article_id}",
+                        )
                     )
-                )
 
-            if LINKWARDEN_URL and LINKWARDEN_API_KEY:
-                keyboard_buttons.append(
-                    InlineKeyboardButton(
-                        "📌 Save to LinkWarden",
-                        callback_data=f"save_to_linkwarden:{article_id}",
+                if LINKWARDEN_URL and LINKWARDEN_API_KEY:
+                    keyboard_buttons.append(
+                        InlineKeyboardButton(
+                            "📌 Save to LinkWarden",
+                            callback_data=f"save_to_linkwarden:{article_id}",
+                        )
                     )
-                )
 
-            reply_markup = InlineKeyboardMarkup([keyboard_buttons])
+                reply_markup = InlineKeyboardMarkup([keyboard_buttons])
 
-            if animation_task:
-                stop_animation_event.set()
-                await animation_task
+                if animation_task:
+                    stop_animation_event.set()
+                    await animation_task
 
-            try:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=telegram_message,
-                    reply_markup=reply_markup,
-                    parse_mode="MarkdownV2",
-                    reply_to_message_id=message.message_id,
-                )
-            except TelegramError as te:
-                print(
-                    f"Failed to send summary due to Telegram API error: {te}",
-                    flush=True,
-                )
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text="⚠️ Temporary Telegram error while sending the summary. Please try again in a moment.",
-                    reply_to_message_id=message.message_id,
-                    parse_mode="HTML",
-                )
-            finally:
                 try:
-                    await context.bot.delete_message(
-                        chat_id=chat_id, message_id=processing_message.message_id
+                    await context.bot.send_message(
+                        chat_id=chat_id,
+                        text=telegram_message,
+                        reply_markup=reply_markup,
+                        parse_mode="MarkdownV2",
+                        reply_to_message_id=message.message_id,
+                    )
+                except TelegramError as te:
+                    print(
+                        f"Failed to send summary due to Telegram API error: {te}",
+                        flush=True,
                     )
-                except TelegramError:
-                    pass
+                    await context.bot.send_message(
+                        chat_id=chat_id,
+                        text="⚠️ Temporary Telegram error while sending the summary. Please try again in a moment.",
+                        reply_to_message_id=message.message_id,
+                        parse_mode="HTML",
+                    )
+                finally:
+                    try:
+                        await context.bot.delete_message(
+                            chat_id=chat_id,
+                            message_id=processing_message.message_id,
+                        )
+                    except TelegramError:
+                        pass
+            finally:
+                # Always awaited, even if formatting or sending fails
+                try:
+                    await history_task
+                except Exception as e:
+                    print(f"Failed to save history for user {chat_id}: {e}")
 
     except QuotaExceededError:
         # Re-raise to be handled by the worker
@@ -417,7 +431,6 @@ async def summarize_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles incoming messages with URLs and adds them to the processing queue.
     """
-    url_pattern = r"https?://[^\s<>\"'\[\]]+"
     text = ""
     url = None
 
@@ -438,11 +451,11 @@ async def summarize_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
             for entity in message.entities:
                 if entity.type == "url":
                     extracted_url = text[entity.offset : entity.offset + entity.length]
-                    if re.match(url_pattern, extracted_url):
+                    if _URL_RE.match(extracted_url):
                         url = extracted_url.rstrip(".,;!)]")
                         break
     if not url:
-        match = re.search(url_pattern, text)
+        match = _URL_RE.search(text)
         if match:
             url = match.group(0).rstrip(".,;!)]")
 
@@ -450,8 +463,9 @@ async def summarize_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_text("🔗 Please send a valid URL.", parse_mode="HTML")
         return
 
-    use_web_search = context.user_data.get("web_search", False)
-    use_url_context = context.user_data.get("url_context", False)
+    prefs = get_prefs(context)
+    use_web_search = prefs.web_search
+    use_url_context = prefs.url_context
 
     task_data = (
         update.effective_chat.id,
@@ -522,7 +536,7 @@ async def handle_qna_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if not url:
         # Fallback: try regex on text just in case
-        url_match = re.search(r"https?://[^\s<>\"'\[\]]+", replied_message.text)
+        url_match = _URL_RE.search(replied_message.text)
         if url_match:
             url = url_match.group(0)
 
@@ -551,7 +565,10 @@ async def handle_qna_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         async with asyncio.timeout(300):  # 5 minutes timeout
             # 1. Re-scrape the article
-            article_content, _, error_details = await scrape_article(url)
+            # Only title and text are needed to answer: skip images and links
+            article_content, _, error_details = await scrape_article(
+                url, include_images=False, include_links=False
+            )
             if not article_content:
                 stop_animation_event.set()
                 await animation_task
@@ -568,12 +585,9 @@ async def handle_qna_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
             summary_text = replied_message.text.split("📖 Original Article")[0].strip()
 
             # 3. Call the new answer_question function
-            default_model = (
-                load_available_models()[0]
-                if load_available_models()
-                else "gemini-1.5-flash"
+            model_name = get_prefs(context).short_summary_model or get_default_model(
+                "gemini-1.5-flash"
             )
-            model_name = context.user_data.get("short_summary_model", default_model)
 
             answer_data = await answer_question(
                 article=article_content,
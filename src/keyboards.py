@@ -2,8 +2,11 @@
 Keyboard layouts for the Telegram bot.
 """
 
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
-from config import load_available_models, load_available_prompts
+from config import get_default_model, load_available_models, load_available_prompts
+from core.user_prefs import get_prefs
 
 
 def get_retry_keyboard(
@@ -17,44 +20,53 @@ def get_retry_keyboard(
     return InlineKeyboardMarkup(keyboard)
 
 
-def get_main_keyboard():
-    """Returns the main keyboard layout."""
-    keyboard = [
+# Built once: the main keyboard never changes and the markup is not mutated
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    [
         ["📝 Choose Prompt", "🤖 Change Model"],
         ["🌐 Web Search On/Off", "🔗 URL Context On/Off"],
         ["📊 API Quota"],
-    ]
+    ],
+    resize_keyboard=True,
+)
+
+
+def get_main_keyboard():
+    """Returns the main keyboard layout."""
+    return MAIN_KEYBOARD
+
+
+@lru_cache(maxsize=32)
+def _build_reply_keyboard(labels: tuple, columns: int) -> ReplyKeyboardMarkup:
+    """Builds (and caches) a reply keyboard for the given labels."""
+    keyboard = [labels[i : i + columns] for i in range(0, len(labels), columns)]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
 def get_model_keyboard():
     """Returns the model selection keyboard."""
-    models = load_available_models()
     # Chunk models into rows of 2 to avoid super long keyboards
-    keyboard = [models[i:i + 2] for i in range(0, len(models), 2)]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return _build_reply_keyboard(tuple(load_available_models()), 2)
 
 
 def get_model_selection_submenu_keyboard(context):
     """Returns the model selection submenu keyboard."""
-    user_data = context.user_data
-    default_model = (
-        load_available_models()[0] if load_available_models() else "gemini-2.5-flash"
-    )
-
-    short_summary_model = user_data.get("short_summary_model", default_model)
-    telegraph_summary_model = user_data.get("telegraph_summary_model", default_model)
+    prefs = get_prefs(context)
+    short_summary_model = prefs.short_summary_model
+    telegraph_summary_model = prefs.telegraph_summary_model
+    if not (short_summary_model and telegraph_summary_model):
+        default_model = get_default_model("gemini-2.5-flash")
+        short_summary_model = short_summary_model or default_model
+        telegraph_summary_model = telegraph_summary_model or default_model
 
-    keyboard = [
-        [f"📄 Short summary model: {short_summary_model}"],
-        [f"📝 Telegraph page model: {telegraph_summary_model}"],
-        ["⬅️ Back to main menu"],
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    labels = (
+        f"📄 Short summary model: {short_summary_model}",
+        f"📝 Telegraph page model: {telegraph_summary_model}",
+        "⬅️ Back to main menu",
+    )
+    return _build_reply_keyboard(labels, 1)
 
 
 def get_prompt_keyboard():
     """Returns the prompt selection keyboard."""
-    prompts = load_available_prompts()
-    keyboard = [[prompt] for prompt in prompts]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return _build_reply_keyboard(tuple(load_available_prompts()), 1)
@@ -1,6 +1,74 @@
 import re
+from functools import lru_cache
 from typing import Tuple
 
+try:  # Motore DFA opzionale (google-re2): tempo lineare, nessun backtracking
+    import re2 as _fast_re
+except ImportError:
+    _fast_re = re
+
+
+def _compile_fast(pattern: str):
+    """
+    Compila ``pattern`` con re2 se disponibile, altrimenti con ``re``.
+
+    Da usare solo per pattern senza lookaround/backreference (non supportati
+    da re2); i flag vanno espressi inline, es. ``(?im)``.
+    """
+    try:
+        return _fast_re.compile(pattern)
+    except Exception:
+        return re.compile(pattern)
+
+# List of allowed tags for Telegram HTML parse mode
+# See: https://core.telegram.org/bots/api#html-style
+_TELEGRAM_ALLOWED_TAGS = [
+    "b",
+    "strong",
+    "i",
+    "em",
+    "u",
+    "ins",
+    "s",
+    "strike",
+    "del",
+    "blockquote",
+    "a",
+    "code",
+    "pre",
+    "tg-spoiler",
+]
+
+# Matches any tag that is not one of the allowed ones (paragraph tags included).
+_UNSUPPORTED_TAG_RE = re.compile(
+    rf"</?(?!({'|'.join(_TELEGRAM_ALLOWED_TAGS)})\b)[a-zA-Z0-9]+\b[^>]*>",
+    re.IGNORECASE,
+)
+
+# Frasi introduttive del LLM da rimuovere, fuse in un'unica alternanza:
+# il "+" finale rimuove anche introduzioni concatenate ("Certo! Ecco il riassunto: ...").
+# Le alternative sono raggruppate per prefisso comune ("Cert...", "Ecco ...") così
+# il motore regex scarta subito le righe che non iniziano con una di esse.
+_INTRO_RE = _compile_fast(
+    r"(?im)^(?:"
+    r"(?:Cert(?:amente|o)|D'accordo|Fatto!?|Benissimo|Ottimo|Perfetto|Va\s+bene)[!.]?\s*"
+    r"|Ecco\s+(?:"
+    r"(?:a\s+te\s+)?(?:il\s+|un\s+)?riassunto[^.!?]*[.!?]"
+    r"|a\s+te[^.!?]*[.!?]"
+    r"|fatto[!.]?"
+    r")\s*"
+    r")+"
+)
+# Una o più righe composte solo da spazi, delimitate da "a capo"
+_BLANK_LINES_RE = re.compile(r"\n\s*\n")
+_LEADING_EMOJI_RE = re.compile(r"^\s*(\S+)\s")
+_HASHTAG_SEPARATORS_RE = re.compile(r"[\s\-.]+")
+
+
+def _replace_unsupported_tag(match: re.Match) -> str:
+    """Replacement for unsupported tags: closing paragraphs become newlines."""
+    return "\n" if match.group(0).lower() == "</p>" else ""
+
 
 def sanitize_html_for_telegram(text: str) -> str:
     """
@@ -13,47 +81,23 @@ def sanitize_html_for_telegram(text: str) -> str:
     if not text:
         return ""
 
-    # List of allowed tags for Telegram HTML parse mode
-    # See: https://core.telegram.org/bots/api#html-style
-    allowed_tags = [
-        "b",
-        "strong",
-        "i",
-        "em",
-        "u",
-        "ins",
-        "s",
-        "strike",
-        "del",
-        "blockquote",
-        "a",
-        "code",
-        "pre",
-        "tg-spoiler",
-    ]
-
-    # 1. Replace paragraph tags with double newlines for better readability
-    text = re.sub(r"<p>", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"</p>", "\n", text, flags=re.IGNORECASE)
-
-    # 2. Build a regex to remove all tags that are NOT in the allowed list
-    # This pattern matches any tag that is not one of the allowed ones.
-    allowed_tags_pattern = "|".join(allowed_tags)
-    unsupported_tags_pattern = re.compile(
-        rf"</?(?!({allowed_tags_pattern})\b)[a-zA-Z0-9]+\b[^>]*>",
-        re.IGNORECASE,
-    )
-
-    sanitized_text = re.sub(unsupported_tags_pattern, "", text)
-
-    # 3. Clean up leading/trailing whitespaces
+    # Single pass: "</p>" becomes a newline for better readability, while "<p>"
+    # and every other tag that is NOT in the allowed list is removed.
+    sanitized_text = _UNSUPPORTED_TAG_RE.sub(_replace_unsupported_tag, text)
+
+    # Clean up leading/trailing whitespaces
     return sanitized_text.strip()
 
 
+@lru_cache(maxsize=512)
 def format_summary_text(text: str) -> str:
     """
     Formatta il testo del riassunto per renderlo più leggibile per Telegram.
 
+    La funzione è pura: i risultati sono memorizzati in cache (vedi
+    ``format_summary_text.cache_clear()``) per evitare di riformattare
+    lo stesso output del LLM, ad esempio dopo un retry.
+
     Features:
     - Rimuove introduzioni del LLM ("Certamente!", "Ecco il riassunto", etc.)
     - Preserva abbreviazioni comuni (Dr., MJ., Inc., etc.)
@@ -64,59 +108,43 @@ def format_summary_text(text: str) -> str:
         return text
 
     # FASE 1: Rimuove introduzioni comuni del LLM
-    # Pattern di frasi introduttive da rimuovere
-    intro_patterns = [
-        r"^Certamente[!.]?\s*",
-        r"^Certo[!.]?\s*",
-        r"^Ecco\s+(a\s+te\s+)?il\s+riassunto[^.!?]*[.!?]\s*",
-        r"^Ecco\s+(a\s+te\s+)?(un\s+)?riassunto[^.!?]*[.!?]\s*",
-        r"^Ecco\s+a\s+te[^.!?]*[.!?]\s*",
-        r"^Va\s+bene[!.]?\s*",
-        r"^Perfetto[!.]?\s*",
-        r"^D'accordo[!.]?\s*",
-        r"^Fatto[!.]?\s*",
-        r"^Fatto![!.]?\s*",
-        r"^Ecco\s+fatto[!.]?\s*",
-        r"^Ottimo[!.]?\s*",
-        r"^Benissimo[!.]?\s*",
-    ]
-
-    # Applica tutti i pattern di rimozione
-    for pattern in intro_patterns:
-        text = re.sub(pattern, "", text, flags=re.IGNORECASE | re.MULTILINE)
-
-    # Rimuove righe vuote all'inizio
-    text = text.lstrip()
-
-    # Rimuove righe vuote ma mantiene i singoli a capo
-    lines = [line for line in text.split("\n") if line.strip()]
+    text = _INTRO_RE.sub("", text)
+
+    # Testo su una sola riga (caso comune per risposte brevi): non ci sono
+    # righe vuote né paragrafi da formattare
+    text = text.strip()
+    if "\n" not in text:
+        return text
+
+    # Rimuove righe vuote (anche all'inizio e alla fine) ma mantiene i singoli
+    # a capo, con un'unica scansione regex invece di split/strip/join per riga
+    text = _BLANK_LINES_RE.sub("\n", text)
+    first_line, newline, rest = text.partition("\n")
 
     # Se c'è più di un paragrafo, il primo viene reso in corsivo,
     # preservando l'emoji iniziale se presente.
-    if len(lines) > 1:
-        first_line = lines[0]
-        emoji_match = re.match(r"^\s*(\S+)\s", first_line)
+    if newline:
+        emoji_match = _LEADING_EMOJI_RE.match(first_line)
         if emoji_match:
             emoji = emoji_match.group(1)
             text_after_emoji = first_line[emoji_match.end(0) :].strip()
             if text_after_emoji and not (
                 text_after_emoji.startswith("*") and text_after_emoji.endswith("*")
             ):
-                lines[0] = f"{emoji} *{text_after_emoji}*"
+                first_line = f"{emoji} *{text_after_emoji}*"
             else:
-                lines[0] = f"{emoji} {text_after_emoji}"
+                first_line = f"{emoji} {text_after_emoji}"
         else:
             stripped_first_line = first_line.strip()
             if stripped_first_line and not (
                 stripped_first_line.startswith("*")
                 and stripped_first_line.endswith("*")
             ):
-                lines[0] = f"*{stripped_first_line}*"
+                first_line = f"*{stripped_first_line}*"
             else:
-                lines[0] = stripped_first_line
+                first_line = stripped_first_line
 
-    # Unisce le righe con un singolo "a capo" per un testo più compatto
-    text = "\n".join(lines)
+    text = first_line + newline + rest
 
     # Trim generale
     return text.strip()
@@ -154,7 +182,7 @@ def parse_hashtags(hashtag_string: str) -> list:
         cleaned_tag = tag.strip(" _#")
 
         # Replace spaces and other problematic characters with underscores
-        cleaned_tag = re.sub(r'[\s\-.]+', '_', cleaned_tag)
+        cleaned_tag = _HASHTAG_SEPARATORS_RE.sub("_", cleaned_tag)
 
         if cleaned_tag:
             hashtags.add(f"#{cleaned_tag}")
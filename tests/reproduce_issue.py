@@ -1,7 +1,8 @@
+import asyncio
 import sys
 import os
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add src to python path
 sys.path.append(os.path.join(os.getcwd(), "src"))
@@ -26,6 +27,10 @@ sys.modules["curl_cffi.requests"] = MagicMock()
 from core import summarizer
 
 class TestSummarizer(unittest.TestCase):
+    def setUp(self):
+        # Clients are cached per API key: drop the mock of the previous test
+        summarizer._gemini_client.cache_clear()
+
     def test_call_gemini_api_none_text(self):
         """Test _call_gemini_api when response.text is None."""
         
@@ -38,13 +43,15 @@ class TestSummarizer(unittest.TestCase):
         # Ensure hasattr(response, "text") is True (default for MagicMock)
         
         # Configure client to return this response
-        mock_client.models.generate_content.return_value = mock_response
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
         
         with patch("google.genai.Client", return_value=mock_client):
-            result = summarizer._call_gemini_api(
-                system_instruction="sys",
-                user_prompt="prompt",
-                model_name="gemini-1.5-flash"
+            result = asyncio.run(
+                summarizer._call_gemini_api(
+                    system_instruction="sys",
+                    user_prompt="prompt",
+                    model_name="gemini-1.5-flash"
+                )
             )
             
             print(f"Result for None response.text: {result}")
@@ -60,14 +67,73 @@ class TestSummarizer(unittest.TestCase):
         # response.candidates is None
         mock_response.candidates = None
         
-        mock_client.models.generate_content.return_value = mock_response
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
         
         with patch("google.genai.Client", return_value=mock_client):
             try:
-                result = summarizer._call_gemini_api("sys", "prompt", "model")
+                result = asyncio.run(
+                    summarizer._call_gemini_api("sys", "prompt", "model")
+                )
                 print(f"Result for all None: {result}")
             except AttributeError as e:
                 print(f"Caught expected crash? {e}")
 
+class TestInflightRequests(unittest.IsolatedAsyncioTestCase):
+    """Concurrent identical cacheable requests share one provider call."""
+
+    MODEL = "Gemini: test-model"
+
+    def setUp(self):
+        for patcher in (
+            patch.object(summarizer.llm_cache, "get", return_value=None),
+            patch.object(summarizer.llm_cache, "put"),
+            patch.object(summarizer, "wait_for_rate_limit"),
+            patch.object(summarizer, "update_model_usage"),
+            patch.dict(summarizer._INFLIGHT, clear=True),
+            patch.dict(summarizer._SEMAPHORES, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def generate(self):
+        return summarizer._generate("sys", "prompt", self.MODEL, cache_ttl=60)
+
+    async def test_identical_requests_are_coalesced(self):
+        async def call(**kwargs):
+            await asyncio.sleep(0.01)
+            return {"summary": "ok", "token_count": 1}
+
+        with patch.object(summarizer, "_call_llm_api", side_effect=call) as api:
+            results = await asyncio.gather(*(self.generate() for _ in range(5)))
+
+        self.assertEqual(api.call_count, 1)
+        self.assertEqual([r["summary"] for r in results], ["ok"] * 5)
+        self.assertEqual(summarizer._INFLIGHT, {})
+
+    async def test_waiters_survive_a_cancelled_leader(self):
+        calls = []
+
+        async def call(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                await asyncio.Event().wait()  # The leader hangs until cancelled
+            return {"summary": "ok", "token_count": 1}
+
+        with patch.object(summarizer, "_call_llm_api", side_effect=call):
+            leader = asyncio.create_task(self.generate())
+            await asyncio.sleep(0.01)
+            waiters = [asyncio.create_task(self.generate()) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(*waiters)
+
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        # One waiter takes over, the other joins it
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([r["summary"] for r in results], ["ok", "ok"])
+        self.assertEqual(summarizer._INFLIGHT, {})
+
+
 if __name__ == "__main__":
     unittest.main()
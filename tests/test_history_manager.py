@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to python path
+sys.path.append(os.path.join(os.getcwd(), "src"))
+
+from core import history_manager as hm
+
+
+class TestHistoryLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for patcher in (
+            patch.object(hm, "HISTORY_DIR", self.tmpdir.name),
+            patch.dict(hm._CACHE, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user_id = 42
+        self.snapshot = hm._get_history_filepath(self.user_id)
+        self.log = hm._get_log_filepath(self.user_id)
+
+    def urls(self):
+        return [entry["url"] for entry in hm.load_history(self.user_id)]
+
+    def test_entries_are_appended_to_the_log(self):
+        hm.add_to_history(self.user_id, "https://a", "A", ["#a"])
+        hm.add_to_history(self.user_id, "https://b", "B", ["#b"])
+
+        self.assertFalse(os.path.exists(self.snapshot))
+        with open(self.log, "rb") as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertEqual(self.urls(), ["https://b", "https://a"])
+
+        # Same result when re-parsed from disk
+        hm._CACHE.clear()
+        self.assertEqual(self.urls(), ["https://b", "https://a"])
+
+    def test_duplicates_are_skipped(self):
+        hm.add_to_history(self.user_id, "https://a", "A", [])
+        hm.add_to_history(self.user_id, "https://a", "A again", [])
+        hm._CACHE.clear()
+        hm.add_to_history(self.user_id, "https://a", "A again", [])
+        self.assertEqual(self.urls(), ["https://a"])
+
+    def test_log_is_compacted_at_threshold(self):
+        with patch.object(hm, "LOG_COMPACT_THRESHOLD", 3):
+            for i in range(3):
+                hm.add_to_history(self.user_id, f"https://{i}", str(i), [])
+            self.assertFalse(os.path.exists(self.log))
+            self.assertTrue(os.path.exists(self.snapshot))
+
+            hm.add_to_history(self.user_id, "https://3", "3", [])
+            self.assertTrue(os.path.exists(self.log))
+
+        hm._CACHE.clear()
+        self.assertEqual(
+            self.urls(), ["https://3", "https://2", "https://1", "https://0"]
+        )
+
+    def test_history_is_bounded(self):
+        with patch.object(hm, "MAX_HISTORY_SIZE", 2):
+            for i in range(3):
+                hm.add_to_history(self.user_id, f"https://{i}", str(i), [])
+            self.assertEqual(self.urls(), ["https://2", "https://1"])
+            # The evicted URL can be added again
+            hm.add_to_history(self.user_id, "https://0", "0", [])
+            self.assertEqual(self.urls(), ["https://0", "https://2"])
+
+    def test_save_history_replaces_the_cached_copy(self):
+        hm.add_to_history(self.user_id, "https://a", "A", [])
+        hm.save_history(self.user_id, [])
+        self.assertFalse(os.path.exists(self.log))
+        self.assertEqual(self.urls(), [])
+        # The URL index is invalidated with the history
+        hm.add_to_history(self.user_id, "https://a", "A", [])
+        self.assertEqual(self.urls(), ["https://a"])
+
+    def test_update_hashtags(self):
+        hm.add_to_history(self.user_id, "https://a", "A", ["#old"])
+        hm.add_to_history(self.user_id, "https://b", "B", ["#b"])
+        hm.update_hashtags(self.user_id, "https://a", ["#new"])
+        history = {e["url"]: e["hashtags"] for e in hm.load_history(self.user_id)}
+        self.assertEqual(history, {"https://a": ["#new"], "https://b": ["#b"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to python path
+sys.path.append(os.path.join(os.getcwd(), "src"))
+
+# Mock environment variables before importing modules that use them
+os.environ["TELEGRAM_BOT_TOKEN"] = "fake_token"
+
+from core import llm_cache
+
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "cache", "llm_cache.sqlite3")
+        for name, value in (
+            ("LLM_CACHE_PATH", path),
+            ("_conn", None),
+            ("_writes", 0),
+        ):
+            patcher = patch.object(llm_cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Cleanups run last-in first-out: close before the patches are undone
+        self.addCleanup(self.tmpdir.cleanup)
+        self.addCleanup(lambda: llm_cache._conn and llm_cache._conn.close())
+
+    def count_rows(self):
+        conn = llm_cache._get_conn()
+        return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def test_roundtrip(self):
+        key = llm_cache.make_key("gemini", "model", "prompt")
+        self.assertIsNone(llm_cache.get(key))
+        llm_cache.put(key, {"text": "summary", "tokens": 3}, ttl=60)
+        self.assertEqual(llm_cache.get(key), {"text": "summary", "tokens": 3})
+
+    def test_expired_entries_are_not_returned(self):
+        key = llm_cache.make_key("k")
+        with patch("core.llm_cache.time.time", return_value=1000.0):
+            llm_cache.put(key, {"text": "old"}, ttl=10)
+        with patch("core.llm_cache.time.time", return_value=1005.0):
+            self.assertEqual(llm_cache.get(key), {"text": "old"})
+        with patch("core.llm_cache.time.time", return_value=1011.0):
+            self.assertIsNone(llm_cache.get(key))
+
+    def test_non_positive_ttl_disables_the_cache(self):
+        key = llm_cache.make_key("k")
+        llm_cache.put(key, {"text": "x"}, ttl=0)
+        llm_cache.put(key, {"text": "x"}, ttl=-1)
+        self.assertIsNone(llm_cache.get(key))
+        self.assertEqual(llm_cache._writes, 0)
+
+    def test_expired_rows_are_purged_periodically(self):
+        with patch.object(llm_cache, "_PURGE_EVERY", 3):
+            with patch("core.llm_cache.time.time", return_value=1000.0):
+                llm_cache.put("a", {"text": "a"}, ttl=1)
+                llm_cache.put("b", {"text": "b"}, ttl=1)
+            with patch("core.llm_cache.time.time", return_value=2000.0):
+                llm_cache.put("c", {"text": "c"}, ttl=1)
+        self.assertEqual(self.count_rows(), 1)
+        self.assertIsNone(llm_cache.get("a"))
+
+    def test_key_separates_parts(self):
+        self.assertNotEqual(
+            llm_cache.make_key("ab", "c"), llm_cache.make_key("a", "bc")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
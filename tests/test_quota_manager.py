@@ -0,0 +1,225 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# Add src to python path
+sys.path.append(os.path.join(os.getcwd(), "src"))
+
+# Mock environment variables before importing modules that use them
+os.environ["TELEGRAM_BOT_TOKEN"] = "fake_token"
+
+from core import quota_manager as qm
+
+
+class QuotaFileTestCase(unittest.TestCase):
+    """Points quota_manager at a temporary quota.json / usage.log."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.quota_file = os.path.join(self.tmpdir.name, "quota.json")
+        self.log_file = os.path.join(self.tmpdir.name, "usage.log")
+        for name, value in (
+            ("QUOTA_FILE", self.quota_file),
+            ("USAGE_LOG_FILE", self.log_file),
+            ("_quota_cache", None),
+            ("_quota_mtime", None),
+            ("_quota_digest", None),
+            ("_usage_appends", 0),
+            # Flushes are triggered explicitly by the tests
+            ("_start_flush_thread", lambda: None),
+        ):
+            patcher = patch.object(qm, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        qm._quota_dirty.clear()
+        self.addCleanup(qm._quota_dirty.clear)
+        self.addCleanup(qm._rate_limits.clear)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_quota(self, data):
+        with open(self.quota_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def read_quota(self):
+        with open(self.quota_file, "rb") as f:
+            return json.loads(f.read())
+
+
+class TestSchemaMigration(QuotaFileTestCase):
+    def test_legacy_schema_is_migrated_and_persisted(self):
+        now = time.time()
+        self.write_quota(
+            {
+                "gemini": {
+                    "gemini-2.5-flash": {
+                        "requests_per_minute": 10,
+                        # Legacy records: dicts, ISO timestamps, out of order
+                        "usage_timestamps": [
+                            {"timestamp": now - 10, "tokens": 7},
+                            {
+                                "timestamp": time.strftime(
+                                    "%Y-%m-%dT%H:%M:%S",
+                                    time.localtime(int(now) - 60),
+                                ),
+                                "tokens": 3,
+                            },
+                        ],
+                    }
+                },
+                "groq": {},
+                # Legacy OpenRouter section: one entry per model
+                "openrouter": {
+                    "b:free": {},
+                    "a:free": {
+                        "usage_timestamps": [{"timestamp": now, "tokens": 1}]
+                    },
+                },
+            }
+        )
+
+        data = qm.get_quota_data()
+
+        gemini = data["gemini"]["gemini-2.5-flash"]
+        self.assertEqual(gemini["usage_tokens"], [3, 7])
+        timestamps = gemini["usage_timestamps"]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(data["openrouter"]["models"], ["a:free", "b:free"])
+        self.assertEqual(list(data["openrouter"]["usage"]), ["a:free"])
+        self.assertEqual(data["openrouter"]["usage"]["a:free"]["usage_tokens"], [1])
+
+        # The converted data is written back once
+        self.assertTrue(qm._quota_dirty.is_set())
+        qm.flush_quota_data()
+        stored = self.read_quota()
+        self.assertEqual(stored["gemini"]["gemini-2.5-flash"]["usage_tokens"], [3, 7])
+        self.assertIn("models", stored["openrouter"])
+
+
+class TestUsageLogReplay(QuotaFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_quota(
+            {
+                "gemini": {"gemini-2.5-flash": {"requests_per_minute": 10}},
+                "groq": {},
+                "openrouter": {"models": [], "usage": {}},
+            }
+        )
+
+    def test_records_appended_before_a_crash_are_replayed(self):
+        qm.update_model_usage("gemini-2.5-flash", 5, "gemini")
+        qm.update_model_usage("gemini-2.5-flash", 6, "gemini")
+
+        # Crash before the flush: quota.json is stale, the log is not
+        with patch.object(qm, "_quota_cache", None), patch.object(
+            qm, "_quota_mtime", None
+        ):
+            data = qm.get_quota_data()
+            model = data["gemini"]["gemini-2.5-flash"]
+            self.assertEqual(model["usage_tokens"], [5, 6])
+
+    def test_replay_skips_compacted_records_and_keeps_order(self):
+        now = time.time()
+        snapshot = {
+            "gemini": {
+                "gemini-2.5-flash": {
+                    "usage_timestamps": [now - 30, now - 10],
+                    "usage_tokens": [1, 2],
+                }
+            },
+            "groq": {},
+            "openrouter": {"models": [], "usage": {}},
+        }
+        self.write_quota(snapshot)
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            for t, tok in (
+                (now - 10, 2),  # Already in the snapshot (partial compaction)
+                (now - 20, 9),  # Older than the snapshot's newest record
+                (now - 2 * qm.DAY_WINDOW, 4),  # Outside the 24h window
+            ):
+                record = {"p": "gemini", "m": "gemini-2.5-flash", "t": t, "tok": tok}
+                f.write(json.dumps(record) + "\n")
+            f.write('{"p": "gemini", "m": "gem')  # Partially written line
+
+        model = qm.get_quota_data()["gemini"]["gemini-2.5-flash"]
+        self.assertEqual(model["usage_timestamps"], [now - 30, now - 20, now - 10])
+        self.assertEqual(model["usage_tokens"], [1, 9, 2])
+
+    def test_compaction_moves_the_log_into_the_snapshot(self):
+        qm.update_model_usage("gemini-2.5-flash", 5, "gemini")
+        qm.compact_usage_log()
+        qm.flush_quota_data()
+        self.assertEqual(os.path.getsize(self.log_file), 0)
+        stored = self.read_quota()
+        self.assertEqual(stored["gemini"]["gemini-2.5-flash"]["usage_tokens"], [5])
+
+
+class TestFlushDigest(QuotaFileTestCase):
+    def test_unchanged_data_is_not_rewritten(self):
+        data = {
+            "gemini": {"gemini-2.5-flash": {"requests_per_minute": 10}},
+            "groq": {},
+            "openrouter": {"models": [], "usage": {}},
+        }
+        qm.save_quota_data(data)
+        with patch.object(qm, "_atomic_write", wraps=qm._atomic_write) as write:
+            qm.flush_quota_data()
+            self.assertEqual(write.call_count, 1)
+
+            # Same contents saved again: no write
+            qm.save_quota_data(data)
+            qm.flush_quota_data()
+            self.assertEqual(write.call_count, 1)
+            self.assertFalse(qm._quota_dirty.is_set())
+
+            data["gemini"]["gemini-2.5-flash"]["requests_per_minute"] = 20
+            qm.save_quota_data(data)
+            qm.flush_quota_data()
+            self.assertEqual(write.call_count, 2)
+
+        stored = self.read_quota()
+        model = stored["gemini"]["gemini-2.5-flash"]
+        self.assertEqual(model["requests_per_minute"], 20)
+
+
+class TestRateLimitSlots(unittest.TestCase):
+    def setUp(self):
+        for patcher in (
+            # 3 requests and 100 tokens per minute
+            patch.object(qm, "_rate_limit", return_value=("gemini", 3, 100)),
+            patch.dict(qm.request_timestamps, clear=True),
+            patch.dict(qm.token_reservations, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def wait(self, now, tokens=0):
+        """Calls wait_for_rate_limit at time ``now``, returns the time waited."""
+        with patch.object(qm.time, "time", return_value=now), patch.object(
+            qm.time, "sleep"
+        ) as sleep:
+            qm.wait_for_rate_limit("model", "gemini", tokens)
+        return sleep.call_args[0][0] if sleep.called else 0
+
+    def test_slots_are_reserved_in_order(self):
+        window = qm.request_timestamps.setdefault("gemini:model", [])
+        self.assertEqual(self.wait(1000, tokens=80), 0)
+        # Over the TPM limit: reserved when the first request leaves the window
+        self.assertEqual(self.wait(1000, tokens=80), 61)
+        # Free RPM slot now, before the reservation in the future
+        self.assertEqual(self.wait(1001), 0)
+        self.assertEqual(window, [1000, 1001, 1061])
+
+        # Full window: each caller queues behind the oldest of the last 3
+        self.assertEqual(self.wait(1002), 1061 - 1002)
+        self.assertEqual(self.wait(1002), 1062 - 1002)
+        self.assertEqual(window, sorted(window))
+        self.assertEqual(len(window), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()